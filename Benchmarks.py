@@ -0,0 +1,185 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from itertools import product
+import numpy as np
+import NetworkFunctions as NFunc
+import EvolutionFunctions as GAFunc
+import FitnessFunctions as FFunc
+
+# benchmarks of the hot paths of the evolution. Every case is timed over a population of genomes, half of them random
+# networks as in the first generations and half feed-forward networks like the evolved solutions, where gates only
+# take inputs from gates with a larger number. The first call of every case is reported on its own as warmup, as it
+# includes the numba compilation, or loading from the numba cache, of any function not compiled yet
+#
+# python Benchmarks.py --save baseline.json stores the results, python Benchmarks.py --compare baseline.json flags every
+# case whose median time per call grew by more than the tolerance. --quick runs the smallest sizes only. --startup
+# reports the startup time of the experiment scripts instead
+popSizes = [100, 1000]
+lengths = [13, 50]
+inputCounts = [4, 6]
+repeats = 5
+modularitySample = 100
+tolerance = 0.25
+
+config = dict([("mutation weights", [0.3, 0.05, 0.05, 0.25, 0.35]), ("elite fraction", 0.3),
+               ("batched fitness", True)])
+
+# startup is timed in fresh interpreters, each importing an experiment script and running a first generation the way
+# the script does. Every script is launched twice, the first launch compiling whatever is missing from the numba cache
+# and the second loading it from the cache
+startupExperiments = ["FixedGoals", "ModularGoals", "ModularityDecay", "MaximumModularity"]
+startupProbe = """
+import json, sys, time
+t1 = time.perf_counter()
+import {experiment} as experiment
+t2 = time.perf_counter()
+import Benchmarks
+Benchmarks.firstGeneration(experiment)
+t3 = time.perf_counter()
+print(json.dumps(dict([("import", t2 - t1), ("first generation", t3 - t2)] +
+                      [(module, module in sys.modules) for module in ["networkx", "matplotlib"]])))
+"""
+
+
+def samplePopulation(popSize, length, inputCount, seed=0):
+    random.seed(seed)
+    np.random.seed(seed)
+    population = np.array([NFunc.randomNetwork(length, inputCount) for i in range(popSize)])
+    for genome in population[popSize // 2:]:
+        for gate in range(length):
+            possibleConnections = np.concatenate([np.arange(-inputCount, 0), np.arange(gate + 1, length)])
+            genome[gate * 2:gate * 2 + 2] = np.random.choice(possibleConnections, 2)
+    # stored as the experiments store their populations
+    return population.astype(NFunc.geneDtype(length, inputCount))
+
+
+def getCases(popSize, length, inputCount):
+    # returns the name of every case and a function running it once
+    population = samplePopulation(popSize, length, inputCount)
+    possibleInputs = np.array(list(product([1, 0], repeat=inputCount)))
+    packedInputs = NFunc.packInputs(possibleInputs)
+    target = FFunc.packTarget(np.random.randint(0, 2, len(possibleInputs)))
+    sample = population[:modularitySample]
+    fitnessFunc = lambda x: FFunc.populationFitness(x, target, possibleInputs, packedInputs, 0.1, 11)
+
+    cases = [
+        ("resolve", lambda: [NFunc.resolve(0, genome, possibleInputs[0]) for genome in population]),
+        ("truthTable", lambda: [NFunc.truthTable(genome, possibleInputs) for genome in population]),
+        ("truthTableBitParallel",
+         lambda: [NFunc.truthTableBitParallel(genome, possibleInputs, packedInputs) for genome in population]),
+        ("populationFitness", lambda: fitnessFunc(population)),
+        ("getPrecursors", lambda: [NFunc.getPrecursors(genome) for genome in population]),
+        ("getPrecursorsWithInputs",
+         lambda: [NFunc.getPrecursorsWithInputs(genome, None, inputCount) for genome in population]),
+        ("populationPrecursors", lambda: NFunc.populationPrecursors(population, inputCount)),
+        ("getGraph", lambda: [NFunc.getGraph(genome, inputCount) for genome in sample]),
+        ("getModularity networkx", lambda: [NFunc.getModularity(genome, "networkx") for genome in sample]),
+        ("getModularity cnm", lambda: [NFunc.getModularity(genome, "cnm") for genome in sample]),
+        ("populationModularity cnm", lambda: NFunc.populationModularity(sample, "cnm")),
+        ("mutate", lambda: GAFunc.mutate([genome.copy() for genome in population], config["mutation weights"],
+                                         config["elite fraction"], inputCount)),
+        ("mutatePopulation", lambda: GAFunc.mutatePopulation(population, config["mutation weights"],
+                                                             config["elite fraction"], inputCount=inputCount)),
+        ("runGeneration", lambda: GAFunc.runGeneration(population, fitnessFunc, lambda a, b: (0, 0), config,
+                                                       inputCount=inputCount)),
+    ]
+    return cases
+
+
+def timeCase(func):
+    t1 = time.perf_counter()
+    func()
+    warmup = time.perf_counter() - t1
+
+    times = []
+    for k in range(repeats):
+        t1 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t1)
+    return {"warmup": warmup, "best": min(times), "median": float(np.median(times))}
+
+
+def runBenchmarks(quick=False):
+    results = {}
+    grid = [(popSizes[0], lengths[0], inputCounts[0])] if quick else product(popSizes, lengths, inputCounts)
+    for popSize, length, inputCount in grid:
+        for name, func in getCases(popSize, length, inputCount):
+            key = name + " popSize=" + str(popSize) + " length=" + str(length) + " inputCount=" + str(inputCount)
+            results[key] = timeCase(func)
+            print(key + ": " + str(results[key]["median"]) + " s (warmup " + str(results[key]["warmup"]) + " s)")
+    return {"python": sys.version, "platform": platform.platform(), "machine": platform.machine(),
+            "numpy": np.__version__, "results": results}
+
+
+def firstGeneration(experiment):
+    # one generation of a small population of the experiment, scored by its fitness function
+    population = NFunc.randomPopulation(100, experiment.length, experiment.inputCount)
+    if hasattr(experiment, "goalFitness"):
+        fitnessFunc = experiment.goalFitness[experiment.goalNames[experiment.goalIndex(0)]]
+    else:
+        fitnessFunc = experiment.modularityFitness
+    GAFunc.runGeneration(population, fitnessFunc, experiment.averageModularity, experiment.config,
+                         inputCount=experiment.inputCount)
+
+
+def measureStartup(experiments):
+    # the launch, import and first generation times of every experiment, and which heavy modules it loaded
+    report = {}
+    for experiment in experiments:
+        for launch in ["first launch", "second launch"]:
+            t1 = time.perf_counter()
+            output = subprocess.run([sys.executable, "-c", startupProbe.format(experiment=experiment)], check=True,
+                                    capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            result["launch"] = time.perf_counter() - t1
+            report[experiment + " " + launch] = result
+            print(experiment + " " + launch + ": " + str(round(result["launch"], 2)) + " s in total, " +
+                  str(round(result["import"], 2)) + " s importing, " + str(round(result["first generation"], 2)) +
+                  " s to the end of the first generation. Loaded networkx: " + str(result["networkx"]) +
+                  ", matplotlib: " + str(result["matplotlib"]))
+    return report
+
+
+def compare(current, baseline, tolerance):
+    # returns the cases that got slower than the baseline by more than tolerance
+    regressions = []
+    for key, result in current["results"].items():
+        if key not in baseline["results"]:
+            continue
+        ratio = result["median"] / baseline["results"][key]["median"]
+        if ratio > 1 + tolerance:
+            regressions.append((key, ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--save", help="store the results as a baseline at this path")
+    parser.add_argument("--compare", help="flag regressions against the baseline at this path")
+    parser.add_argument("--tolerance", type=float, default=tolerance)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--startup", action="store_true", help="report the startup time of the experiment scripts")
+    arguments = parser.parse_args()
+
+    if arguments.startup:
+        measureStartup(startupExperiments)
+        sys.exit(0)
+
+    current = runBenchmarks(arguments.quick)
+    if arguments.save is not None:
+        with open(arguments.save, "w") as outputFile:
+            json.dump(current, outputFile, indent=1)
+
+    if arguments.compare is not None:
+        with open(arguments.compare) as inputFile:
+            regressions = compare(current, json.load(inputFile), arguments.tolerance)
+        for key, ratio in regressions:
+            print("Regression: " + key + " is " + str(round(ratio, 2)) + " times slower than the baseline")
+        print(str(len(regressions)) + " regressions found")
+        if len(regressions) > 0:
+            sys.exit(1)
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+import threading
+
+
+class LRUCache(object):
+    # dictionary that holds at most maxSize items, the least recently used item is dropped first
+    # hits and misses count the lookups made through get. get and put can be called from several threads
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.maxSize:
+                self.items.popitem(last=False)
+
+    def getMany(self, keys):
+        # get of every key in keys under a single acquisition of the lock, None for those missing
+        with self.lock:
+            values = []
+            for key in keys:
+                if key in self.items:
+                    self.items.move_to_end(key)
+                    values.append(self.items[key])
+                else:
+                    values.append(None)
+            found = len(values) - values.count(None)
+            self.hits += found
+            self.misses += len(values) - found
+            return values
+
+    def putMany(self, keys, values):
+        # put of every pair of keys and values under a single acquisition of the lock
+        with self.lock:
+            for key, value in zip(keys, values):
+                self.items[key] = value
+                self.items.move_to_end(key)
+            while len(self.items) > self.maxSize:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
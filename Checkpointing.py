@@ -0,0 +1,43 @@
+import os
+import pickle
+import random
+import time
+import numpy as np
+
+
+class Checkpointer(object):
+    # saves the state of a run to path at most once every interval seconds, together with the state of the random number
+    # generators, so that a run resumed from it continues exactly as the original would have. The time limit bounds
+    # the fraction of the run spent writing checkpoints. interval=None disables checkpoints
+    def __init__(self, path, interval=300):
+        self.path = path
+        self.interval = interval
+        self.lastSave = time.perf_counter()
+
+    def due(self):
+        return self.interval is not None and time.perf_counter() - self.lastSave >= self.interval
+
+    def save(self, **state):
+        state["randomState"] = random.getstate()
+        state["numpyState"] = np.random.get_state()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # write to a temporary file first so a crash while saving leaves the previous checkpoint intact
+        temporaryPath = self.path + ".tmp"
+        with open(temporaryPath, "wb") as outputFile:
+            pickle.dump(state, outputFile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporaryPath, self.path)
+        self.lastSave = time.perf_counter()
+
+    def load(self):
+        # returns the saved state and restores the random number generators, or None if there is no checkpoint
+        if self.interval is None or not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as inputFile:
+            state = pickle.load(inputFile)
+        random.setstate(state.pop("randomState"))
+        np.random.set_state(state.pop("numpyState"))
+        return state
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,144 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import RunStorage
+
+# loaders used by DataProcessing. Every text output file is indexed once: its length, the value on its last line and
+# the byte offsets of its last tailSamples lines are kept in an index file, checked against the size and modification
+# time of the file. Summaries and tails of runs are then answered from the index and short reads at the end of the
+# file. Full columns are parsed once and cached as .npy files that are memory mapped on later loads
+cacheDirectory = "Data/Cache/"
+tailSamples = 40
+
+
+class RunIndex(object):
+    def __init__(self, path=cacheDirectory + "RunIndex.json"):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.changed = False
+        if os.path.exists(path):
+            with open(path) as inputFile:
+                self.entries = json.load(inputFile)
+
+    def entry(self, path):
+        status = os.stat(path)
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry is None or entry["size"] != status.st_size or entry["mtime"] != status.st_mtime_ns:
+            entry = indexFile(path)
+            entry["size"] = status.st_size
+            entry["mtime"] = status.st_mtime_ns
+            with self.lock:
+                self.entries[path] = entry
+                self.changed = True
+        return entry
+
+    def save(self):
+        if not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporaryPath = self.path + ".tmp"
+        with open(temporaryPath, "w") as outputFile:
+            json.dump(self.entries, outputFile)
+        os.replace(temporaryPath, self.path)
+        self.changed = False
+
+
+def indexFile(path):
+    # length, value of the first column on the last line and offsets of the last tailSamples lines of a text output
+    with open(path, "rb") as inputFile:
+        data = inputFile.read().rstrip(b"\n")
+    if len(data) == 0:
+        return {"length": 0, "last": None, "tailOffsets": []}
+
+    offsets = []
+    end = len(data)
+    while len(offsets) < tailSamples and end > 0:
+        start = data.rfind(b"\n", 0, end) + 1
+        offsets.append(start)
+        end = start - 1
+    offsets.reverse()
+    return {"length": data.count(b"\n") + 1, "last": float(data[offsets[-1]:].split(b",")[0]), "tailOffsets": offsets}
+
+
+runIndex = RunIndex()
+
+
+def parallelMap(func, items):
+    with ThreadPoolExecutor(os.cpu_count()) as pool:
+        return list(pool.map(func, items))
+
+
+def runSummary(directory, runName):
+    # number of generations and final fitness of a run
+    if os.path.exists(RunStorage.runFile(directory, runName)):
+        fitness = RunStorage.readFitness(directory, runName)
+        return len(fitness), fitness[-1] if len(fitness) > 0 else np.nan
+    entry = runIndex.entry(RunStorage.textFitnessPath(directory, runName))
+    return entry["length"], entry["last"] if entry["last"] is not None else np.nan
+
+
+def loadSummaries(directory, fileCount):
+    # lengths and final fitnesses of runs 0 to fileCount - 1
+    summaries = parallelMap(lambda i: runSummary(directory, str(i)), range(fileCount))
+    runIndex.save()
+    lengths = np.array([length for length, _ in summaries])
+    finalFitnesses = np.array([final for _, final in summaries])
+    return lengths, finalFitnesses
+
+
+def tailModularity(directory, runName, samples=tailSamples):
+    # mean modularity of the last samples generations of a run, read from the end of the file only
+    if os.path.exists(RunStorage.runFile(directory, runName)):
+        return RunStorage.readModularity(directory, runName)[-samples:, 0]
+    path = directory + "Modularity/Modularity" + runName + ".txt"
+    offsets = runIndex.entry(path)["tailOffsets"][-samples:]
+    if samples > tailSamples or len(offsets) == 0:
+        return RunStorage.readModularity(directory, runName)[-samples:, 0]
+    with open(path, "rb") as inputFile:
+        inputFile.seek(offsets[0])
+        lines = inputFile.read().rstrip(b"\n").split(b"\n")
+    return np.array([float(line.split(b",")[0]) for line in lines])
+
+
+def loadTails(directory, fileCount, samples=tailSamples):
+    tails = parallelMap(lambda i: tailModularity(directory, str(i), samples), range(fileCount))
+    runIndex.save()
+    return tails
+
+
+def cachedColumn(path, parse):
+    # parse a text output once and keep the result as a .npy file named after the path, size and modification time
+    status = os.stat(path)
+    key = path + ":" + str(status.st_size) + ":" + str(status.st_mtime_ns)
+    cachePath = cacheDirectory + "Columns/" + hashlib.blake2b(key.encode(), digest_size=16).hexdigest() + ".npy"
+    if os.path.exists(cachePath):
+        return np.load(cachePath, mmap_mode="r")
+    values = parse()
+    os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+    temporaryPath = cachePath[:-len(".npy")] + "." + str(threading.get_ident()) + ".tmp.npy"
+    np.save(temporaryPath, values)
+    os.replace(temporaryPath, cachePath)
+    return values
+
+
+def loadFitness(directory, runName):
+    if os.path.exists(RunStorage.runFile(directory, runName)):
+        return RunStorage.readFitness(directory, runName)
+    return cachedColumn(RunStorage.textFitnessPath(directory, runName),
+                        lambda: RunStorage.readFitness(directory, runName))
+
+
+def loadModularity(directory, runName):
+    if os.path.exists(RunStorage.runFile(directory, runName)):
+        return RunStorage.readModularity(directory, runName)
+    return cachedColumn(directory + "Modularity/Modularity" + runName + ".txt",
+                        lambda: RunStorage.readModularity(directory, runName))
+
+
+def loadModularities(directory, runNames):
+    return parallelMap(lambda runName: loadModularity(directory, runName), runNames)
@@ -1,27 +1,26 @@
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.patches import Polygon
 from math import ceil
+import DataLoading
+
+# runs are read through DataLoading, which answers lengths, final fitnesses and the last samples of every run from a
+# cached index and only parses full files for the runs that are plotted
+def getTrajectory(directory, runName, maxSize):
+    trajectory = np.full(maxSize, np.nan)
+    data = DataLoading.loadFitness(directory, runName)
+    trajectory[:len(data)] = data
+    return trajectory
+
 
-def getTrajectories(path, fileCount, maxSize):
-    trajectories = np.full((fileCount, maxSize), np.nan)
-    for i in range(fileCount):
-        with open(path + str(i) + ".txt") as file:
-            data = np.array(file.readlines())
-        trajectories[i][:len(data)] = data
-    return trajectories
+def getSolveLengths(directory, fileCount):
+    # length of the runs that ended in a solution
+    lengths, finalFitnesses = DataLoading.loadSummaries(directory, fileCount)
+    return lengths[finalFitnesses == 1]
 
 
-def getModularity(path, fileCount):
+def getModularity(directory, fileCount):
     modularities = np.full(fileCount, np.nan)
-    for i in range(fileCount):
-        with open(path + str(i) + ".txt") as file:
-            data = file.readlines()
-
-        samples = 40
-        mod = np.full(samples, np.nan)
-        for j,k in enumerate(data[-samples:]):
-            mod[j] = k.split(",")[0]
+    samples = 40
+    for i, mod in enumerate(DataLoading.loadTails(directory, fileCount, samples)):
         mod = mod[~np.isnan(mod)]
         if len(mod) > 0:
             modularities[i] = np.mean(mod)
@@ -31,16 +30,11 @@ def getModularity(path, fileCount):
 
 maxLength = int(1E5)
 
-# get the fitness over time of all experiments
-G1Fitness = getTrajectories("Data/FixedGoals/G1/Fitness/Fitness", 50, maxLength)
-G2Fitness = getTrajectories("Data/FixedGoals/G2/Fitness/Fitness", 50, maxLength)
-MixedFitness = getTrajectories("Data/ModularGoals/Fitness/Fitness", 100, maxLength)
-
 # find time needed to complete simulation
 # when doing the experiments the simulation was carried on for some time before terminating so this is accounted for
-lengthG1 = np.array([len(run[~np.isnan(run)]) for run in G1Fitness if run[~np.isnan(run)][-1] == 1])-20
-lengthG2 = np.array([len(run[~np.isnan(run)]) for run in G2Fitness if run[~np.isnan(run)][-1] == 1])-20
-lengthModularGoals = np.array([len(run[~np.isnan(run)]) for run in MixedFitness if run[~np.isnan(run)][-1] == 1])-400
+lengthG1 = getSolveLengths("Data/FixedGoals/G1/", 50)-20
+lengthG2 = getSolveLengths("Data/FixedGoals/G2/", 50)-20
+lengthModularGoals = getSolveLengths("Data/ModularGoals/", 100)-400
 
 # take means and 1st and 3rd quartiles
 meanG1 = np.median(lengthG1)
@@ -60,9 +54,13 @@ print("Time taken to complete G2: " + str(meanG2) + " (" + str(quartilesG2[0]) +
 print("Time taken to complete alternating G1 and G2: " + str(meanModular) + " (" + str(quartilesModular[0]) + ", " + str(quartilesModular[1]) + ")")
 
 
+# matplotlib is only imported once the statistics above are printed, as importing it takes a while
+import matplotlib.pyplot as plt
+from matplotlib.patches import Polygon
+
 # plot the fitness against time of a chosen run, number was varied to get an attractive looking run
 chosen = 0
-chosen = G1Fitness[chosen]
+chosen = getTrajectory("Data/FixedGoals/G1/", str(chosen), maxLength)
 fig, ax = plt.subplots()
 xdata = list(range(len(chosen)))
 ydata = chosen
@@ -78,7 +76,7 @@ plt.savefig("Figures/TypicalG1Run.png")
 
 # plot the fitness against time of a chosen run, number was varied to get an attractive looking run
 chosen = 30
-chosen = MixedFitness[chosen][~np.isnan(MixedFitness[chosen])]
+chosen = np.array(DataLoading.loadFitness("Data/ModularGoals/", str(chosen)))
 chosenLength = len(chosen)
 
 # for the long plot, plot every resolution item so only the very end of the epoch is shown
@@ -109,9 +107,9 @@ plt.savefig("Figures/TypicalModularRun.png")
 
 
 # extract the average modularity of the individuals with fitness 1 from the data folder
-MixedModularity = getModularity("Data/ModularGoals/Modularity/Modularity", 100)
-G1modularity = getModularity("Data/FixedGoals/G1/Modularity/Modularity", 50)
-G2modularity = getModularity("Data/FixedGoals/G2/Modularity/Modularity", 50)
+MixedModularity = getModularity("Data/ModularGoals/", 100)
+G1modularity = getModularity("Data/FixedGoals/G1/", 50)
+G2modularity = getModularity("Data/FixedGoals/G2/", 50)
 
 # find the average modularity across all runs
 meanG1, stdG1 = np.round(np.mean(G1modularity), 2), np.round(np.std(G1modularity), 2)
@@ -179,11 +177,9 @@ fileCount = 20
 # for the chosen runs
 history = np.full((chosenCount, fileCount, max), np.nan)
 for i in range(chosenCount):
-    for j in range(fileCount):
-        with open("Data/ModularityDecay/Modularity/Modularity" + str(chosen[i]) + "-" + str(j) + ".txt") as file:
-            data = np.array(file.readlines())
-            data = np.array([line.split(",") for line in data]).T
-        history[i][j] = data[0]
+    runNames = [str(chosen[i]) + "-" + str(j) for j in range(fileCount)]
+    for j, data in enumerate(DataLoading.loadModularities("Data/ModularityDecay/", runNames)):
+        history[i][j] = data[:, 0]
 
 # find the average and error for every timepoint
 avgTraj = np.full((chosenCount, ceil(max/samplingPeriod)), np.nan)
@@ -1,9 +1,17 @@
 import numpy as np
 import random
 import bisect
+from numba import jit
 import NetworkFunctions as NFunc
+import FitnessFunctions as FFunc
+import Profiling
 
-inputCount = 4
+# the number of inputs mutations draw from when none is passed
+defaultInputCount = 4
+
+# the mutation of a generation is done either by mutate, one python call per individual, or by mutatePopulation which
+# acts on the whole population array at once. Set mutationEngine to "python" to use the former
+mutationEngine = "vectorized"
 
 
 class WeightedRandomGenerator(object):
@@ -23,28 +31,103 @@ class WeightedRandomGenerator(object):
         return self.next()
 
 
-def mutate(generation, mutationWeights, fractionElite):
+def mutate(generation, mutationWeights, fractionElite, inputCount=None):
     # choose a type of mutation for every individual. Elite are not mutated.
     popSize = len(generation)
     integers = WeightedRandomGenerator(mutationWeights)
     mutationType = np.array([integers() for i in generation])
     mutationType[:int(popSize * fractionElite)] = [0] * int(popSize * fractionElite)
 
-    mutationFunctions = np.array([lambda x: x, addGate, removeGate, switchInputs, lambda x: x])
+    mutationFunctions = np.array([lambda x: x, lambda x: addGate(x, inputCount), lambda x: removeGate(x, inputCount),
+                                  lambda x: switchInputs(x, inputCount), lambda x: x])
     newGeneration = np.array(
         [mutationFunctions[mutationId](specimen) for mutationId, specimen in zip(mutationType, generation)])
 
-    crossOverPairs = mutationType == 4
-    crossOverCount = sum(crossOverPairs)
-    crossOvers = np.array(list(enumerate(newGeneration)), dtype=object)[crossOverPairs]
-    for (i, specimen1), (k, specimen2) in zip(crossOvers[:crossOverCount // 2], crossOvers[crossOverCount // 2:]):
-        newGeneration[i], newGeneration[k] = crossOver(specimen1, specimen2)
+    crossOvers = np.nonzero(mutationType == 4)[0]
+    crossOverCount = len(crossOvers)
+    for i, k in zip(crossOvers[:crossOverCount // 2], crossOvers[crossOverCount // 2:]):
+        newGeneration[i], newGeneration[k] = crossOver(newGeneration[i], newGeneration[k])
 
     # shuffling ensures diversity in the elite if there are a large fraction of high fitness individuals
     np.random.shuffle(newGeneration)
     return newGeneration
 
 
+def mutatePopulation(generation, mutationWeights, fractionElite, returnParents=False, inputCount=None):
+    # same operators and probabilities as mutate, applied to the 2D array of genomes with one vectorized step per type
+    # of mutation. Elite are not mutated. Returns a new shuffled array and, if returnParents is True, the row of
+    # generation every new individual was made from
+    if inputCount is None:
+        inputCount = defaultInputCount
+    popSize, genomeLength = generation.shape
+    size = genomeLength // 2
+    newGeneration = np.array(generation, copy=True)
+
+    totals = np.cumsum(mutationWeights)
+    mutationType = np.searchsorted(totals, np.random.random(popSize) * totals[-1], side="right")
+    mutationType[:int(popSize * fractionElite)] = 0
+
+    # new gate
+    rows = np.nonzero(mutationType == 1)[0]
+    if len(rows) > 0:
+        addGates(newGeneration, rows, np.random.random(len(rows)),
+                 np.random.randint(-inputCount, size, (len(rows), 2)), np.random.randint(0, genomeLength, len(rows)))
+
+    # gate deletion. Every connection to the target is rewired to a random gate or input other than the target
+    rows = np.nonzero(mutationType == 2)[0]
+    if len(rows) > 0:
+        targets = np.random.randint(1, size, len(rows))[:, None]
+        replacements = np.random.randint(-inputCount, size - 1, (len(rows), genomeLength))
+        replacements += replacements >= targets
+        genomes = newGeneration[rows]
+        newGeneration[rows] = np.where(genomes == targets, replacements, genomes)
+
+    # switch of inputs
+    rows = np.nonzero(mutationType == 3)[0]
+    if len(rows) > 0:
+        targets = np.random.randint(0, genomeLength, len(rows))
+        newGeneration[rows, targets] = np.random.randint(-inputCount, size, len(rows))
+
+    # crossover pairs the first half of the individuals selected for it with the second half, in order
+    rows = np.nonzero(mutationType == 4)[0]
+    pairCount = len(rows) // 2
+    if pairCount > 0:
+        rows1, rows2 = rows[:pairCount], rows[pairCount:pairCount * 2]
+        swapped = np.arange(genomeLength) >= np.random.randint(2, genomeLength - 1, pairCount)[:, None]
+        genomes1, genomes2 = newGeneration[rows1], newGeneration[rows2]
+        newGeneration[rows1] = np.where(swapped, genomes2, genomes1)
+        newGeneration[rows2] = np.where(swapped, genomes1, genomes2)
+
+    # shuffling ensures diversity in the elite if there are a large fraction of high fitness individuals
+    permutation = np.random.permutation(popSize)
+    if returnParents:
+        return newGeneration[permutation], permutation
+    return newGeneration[permutation]
+
+
+@jit(nopython=True, cache=True)
+def addGates(generation, rows, choices, newInputs, connections):
+    # addGate for every genome in rows, with the random draws passed in. The candidate targets are the same as those
+    # addGate finds, where the precursor array is read offset by one
+    size = generation.shape[1] // 2
+    targets = np.empty(size, dtype=np.int64)
+    for n in range(len(rows)):
+        genome = generation[rows[n]]
+        order, _ = NFunc.gateOrder(genome)
+        precursors = np.zeros(size + 1, dtype=np.bool_)
+        precursors[order] = True
+
+        targetCount = 0
+        for i in range(1, size):
+            if i == size - 1 or precursors[i + 1]:
+                targets[targetCount] = i
+                targetCount += 1
+        target = targets[int(choices[n] * targetCount)]
+        genome[target * 2] = newInputs[n, 0]
+        genome[target * 2 + 1] = newInputs[n, 1]
+        genome[connections[n]] = target
+
+
 def crossOver(individual1, individual2):
     # select random point within genomes and swap
     size = len(individual1)
@@ -57,8 +140,10 @@ def crossOver(individual1, individual2):
     return individual1.copy(), individual2.copy()
 
 
-def addGate(genome):
+def addGate(genome, inputCount=None):
     # find a gate which's output is ignored. Change its inputs and connect a random gate to it
+    if inputCount is None:
+        inputCount = defaultInputCount
     size = len(genome) // 2
     nonTargets = np.argwhere(~NFunc.getPrecursors(genome)[1:])
     targets = [i for i in range(1, size) if i not in nonTargets]
@@ -72,8 +157,10 @@ def addGate(genome):
     return genome
 
 
-def removeGate(genome):
+def removeGate(genome, inputCount=None):
     # find all gates connected to the output of target and wire them to another gate
+    if inputCount is None:
+        inputCount = defaultInputCount
     size = len(genome) // 2
     target = random.randint(1, size - 1)
     possible = [x for x in range(-inputCount, size) if x != target]
@@ -83,8 +170,10 @@ def removeGate(genome):
     return genome
 
 
-def switchInputs(genome):
+def switchInputs(genome, inputCount=None):
     # find a random connection and change it to another gate
+    if inputCount is None:
+        inputCount = defaultInputCount
     size = len(genome)
     target = random.randint(0, size - 1)
 
@@ -94,21 +183,152 @@ def switchInputs(genome):
     return genome
 
 
-def runGeneration(population, fitnessFunc, reporterFunc, config):
+def runGeneration(population, fitnessFunc, reporterFunc, config, timer=Profiling.nullTimer, lineage=None,
+                  inputCount=None):
     # calculate fitness for the population, select a fraction to be the elite, reproduce them and return a mutated
     # version of the elite
     # reporterFunc is passed the whole generation and their fitness and its output is returned. Used to probe the
     # population during the simulation
+    # if config["batched fitness"] is True, fitnessFunc is passed the whole population and returns every fitness at once
+    # timer is charged the time taken by every phase of the generation, the time since its last lap, spent in the loop
+    # calling runGeneration, going to the "loop" phase. Start it once per run so that the phases add up to the wall time
+    # lineage is passed the index in population of the parent of every individual of the new generation, or None when
+    # the python mutation engine is used as it does not keep track of them
+    # inputCount is the number of inputs the networks take, the module default is used if it is None
     fractionElite = config["elite fraction"]
     weights = config["mutation weights"]
+    timer.lap("loop")
 
-    fitnesses = np.array([fitnessFunc(individual) for individual in population])
-    indexes = np.argsort(fitnesses)[int(len(population) * (1 - fractionElite)):]
-    elite = population[indexes][::-1]
+    if config.get("batched fitness", False):
+        fitnesses = fitnessFunc(population)
+    else:
+        fitnesses = np.array([fitnessFunc(individual) for individual in population])
+    timer.lap("fitness")
 
-    newGen = [elite[i % len(elite)].copy() for i in range(len(population))]
+    # population is a 2D array of genomes, the elite and the new generation are copied into new arrays of its type
+    indexes = np.argsort(fitnesses)[int(len(population) * (1 - fractionElite)):][::-1]
+    elite = population[indexes]
 
     mostFit = elite[0]
     maxFitness = max(fitnesses)
+    timer.lap("selection")
+
+    if mutationEngine == "vectorized":
+        newGen = elite[np.arange(len(population)) % len(elite)]
+        timer.lap("elite copy")
+        newGen, parents = mutatePopulation(newGen, weights, fractionElite, returnParents=True, inputCount=inputCount)
+        if lineage is not None:
+            lineage(indexes[parents % len(elite)])
+    else:
+        newGen = elite[np.arange(len(population)) % len(elite)]
+        timer.lap("elite copy")
+        newGen = mutate(newGen, weights, fractionElite, inputCount)
+        if lineage is not None:
+            lineage(None)
+    timer.lap("mutation")
+
+    report = reporterFunc(population, fitnesses)
+    timer.lap("reporter")
+
+    return newGen, maxFitness, mostFit, report
+
+
+@jit(nopython=True, cache=True)
+def mutateCompiled(generation, totals, fractionElite, inputCount):
+    # mutatePopulation for compiled code, totals being the cumulative mutation weights. The draws are made from the
+    # random generator of numba, one individual at a time. Returns a new shuffled array and the row of generation every
+    # new individual was made from
+    popSize, genomeLength = generation.shape
+    size = genomeLength // 2
+    newGeneration = generation.copy()
+
+    mutationType = np.zeros(popSize, dtype=np.int64)
+    for n in range(int(popSize * fractionElite), popSize):
+        draw = np.random.random() * totals[-1]
+        while mutationType[n] < len(totals) - 1 and totals[mutationType[n]] <= draw:
+            mutationType[n] += 1
+
+    # new gate
+    rows = np.nonzero(mutationType == 1)[0]
+    addGates(newGeneration, rows, np.random.random(len(rows)), np.random.randint(-inputCount, size, (len(rows), 2)),
+             np.random.randint(0, genomeLength, len(rows)))
+
+    for n in range(popSize):
+        if mutationType[n] == 2:
+            # gate deletion. Every connection to the target is rewired to a random gate or input other than the target
+            target = np.random.randint(1, size)
+            for i in range(genomeLength):
+                if newGeneration[n, i] == target:
+                    replacement = np.random.randint(-inputCount, size - 1)
+                    newGeneration[n, i] = replacement + 1 if replacement >= target else replacement
+        elif mutationType[n] == 3:
+            # switch of inputs
+            newGeneration[n, np.random.randint(0, genomeLength)] = np.random.randint(-inputCount, size)
+
+    # crossover pairs the first half of the individuals selected for it with the second half, in order
+    rows = np.nonzero(mutationType == 4)[0]
+    pairCount = len(rows) // 2
+    for p in range(pairCount):
+        n1 = rows[p]
+        n2 = rows[pairCount + p]
+        for i in range(np.random.randint(2, genomeLength - 1), genomeLength):
+            newGeneration[n1, i], newGeneration[n2, i] = newGeneration[n2, i], newGeneration[n1, i]
+
+    permutation = np.random.permutation(popSize)
+    return newGeneration[permutation], permutation
+
+
+@jit(nopython=True, cache=True)
+def evolveGenerations(population, targets, goalIndexes, reported, totals, fractionElite, inputCount, possibleInputs,
+                      packedInputs, sizeParam, cutoff, seed):
+    # runGeneration for every entry of goalIndexes without leaving compiled code, generation g being scored by
+    # populationFitness against targets[goalIndexes[g]]. Returns the new population, the highest fitness and fittest
+    # individual of every generation, and the population and fitnesses of every generation for which reported is True
+    np.random.seed(seed)
+    popSize, genomeLength = population.shape
+    generations = len(goalIndexes)
+    history = np.empty(generations)
+    winners = np.empty((generations, genomeLength), dtype=population.dtype)
+    reportCount = np.sum(reported)
+    reportPopulations = np.empty((reportCount, popSize, genomeLength), dtype=population.dtype)
+    reportFitnesses = np.empty((reportCount, popSize))
+
+    r = 0
+    for g in range(generations):
+        fitnesses = FFunc.populationFitness(population, targets[goalIndexes[g]], possibleInputs, packedInputs,
+                                            sizeParam, cutoff)
+        if reported[g]:
+            reportPopulations[r] = population
+            reportFitnesses[r] = fitnesses
+            r += 1
+
+        # a stable sort, so ties are broken the same way whatever the platform
+        indexes = np.argsort(fitnesses, kind="mergesort")[int(popSize * (1 - fractionElite)):][::-1]
+        elite = population[indexes]
+        history[g] = np.max(fitnesses)
+        winners[g] = elite[0]
+
+        population, _ = mutateCompiled(elite[np.arange(popSize) % len(elite)], totals, fractionElite, inputCount)
+    return population, history, winners, reportPopulations, reportFitnesses
+
 
-    return mutate(newGen, weights, fractionElite), maxFitness, mostFit, reporterFunc(population, fitnesses)
+def runGenerations(population, targets, goalIndexes, config, inputCount, possibleInputs, packedInputs, sizeParam,
+                   cutoff, reported=None, timer=Profiling.nullTimer):
+    # advance population by len(goalIndexes) generations in one compiled call, in place of as many calls of
+    # runGeneration with populationFitness against targets[goalIndexes[g]] as fitness function. The compiled generator
+    # is seeded from the numpy one, so runs remain reproducible, but the draws differ from those of runGeneration
+    # reported is a boolean array over the generations, by default every one. Returns the new population, the history
+    # and winners of the generations, and (g, population, fitnesses) for every generation g reported. timer is charged
+    # as by runGeneration
+    timer.lap("loop")
+    goalIndexes = np.asarray(goalIndexes, dtype=np.int64)
+    if reported is None:
+        reported = np.ones(len(goalIndexes), dtype=np.bool_)
+    population, history, winners, reportPopulations, reportFitnesses = evolveGenerations(
+        np.ascontiguousarray(population), np.asarray(targets, dtype=np.uint64), goalIndexes,
+        np.asarray(reported, dtype=np.bool_), np.cumsum(config["mutation weights"]).astype(np.float64),
+        config["elite fraction"], inputCount, possibleInputs, packedInputs, sizeParam, cutoff,
+        np.random.randint(2 ** 31))
+    reports = list(zip(np.nonzero(reported)[0], reportPopulations, reportFitnesses))
+    timer.lap("compiled generations")
+    return population, history, winners, reports
@@ -0,0 +1,260 @@
+import numpy as np
+from numba import jit
+import NetworkFunctions as NFunc
+import Caching
+
+
+@jit(nopython=True, cache=True)
+def popCount(word):
+    # number of set bits in a 64 bit word
+    word = word - ((word >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    word = (word & np.uint64(0x3333333333333333)) + ((word >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    word = (word + (word >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (word * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+@jit(nopython=True, cache=True)
+def rowMask(rowCount, w):
+    # the bits of word w that hold a row of the truth table
+    remaining = rowCount - w * 64
+    if remaining >= 64:
+        return ~np.uint64(0)
+    return (np.uint64(1) << np.uint64(remaining)) - np.uint64(1)
+
+
+@jit(nopython=True, cache=True)
+def populationFitness(population, target, possibleInputs, packedInputs, sizeParam, cutoff, chunkWords=1024):
+    # return the fitness of every genome in population, given by the % similarity across all inputs with the packed
+    # target outputs minus a size penalty. Same result as booleanFitness in the experiment scripts. Gates are evaluated
+    # chunkWords words of rows at a time, so memory stays bounded however many inputs the network takes
+    rowCount = len(possibleInputs)
+    wordCount = packedInputs.shape[1]
+    fitnesses = np.empty(len(population))
+    columns = np.empty((population.shape[1] // 2, min(chunkWords, wordCount)), dtype=np.uint64)
+    for j in range(len(population)):
+        genome = population[j]
+        order, cyclic = NFunc.gateOrder(genome)
+
+        correct = 0
+        if cyclic:
+            outputs = NFunc.truthTable(genome, possibleInputs)
+            for i in range(rowCount):
+                if outputs[i] == (target[i // 64] >> np.uint64(i % 64)) & np.uint64(1):
+                    correct += 1
+        else:
+            output = NFunc.evaluateOutput(genome, packedInputs, order, columns)
+            for w in range(wordCount):
+                correct += popCount(~(output[w] ^ target[w]) & rowMask(rowCount, w))
+
+        # every gate connected to gate 0 is in order, which matches the count given by getPrecursors
+        accuracy = correct / rowCount
+        sizePenalty = sizeParam * max(0, len(order) - cutoff)
+        fitnesses[j] = accuracy - sizePenalty
+    return fitnesses
+
+
+@jit(nopython=True, cache=True)
+def outputFitness(outputs, unknown, activeCounts, target, rowCount, sizeParam, cutoff):
+    # populationFitness from the packed output column of every genome, the rows where its output is unknown, and its
+    # number of active gates
+    fitnesses = np.empty(len(outputs))
+    for j in range(len(outputs)):
+        correct = 0
+        for w in range(len(target)):
+            correct += popCount(~(outputs[j, w] ^ target[w]) & ~unknown[j, w] & rowMask(rowCount, w))
+        fitnesses[j] = correct / rowCount - sizeParam * max(0, activeCounts[j] - cutoff)
+    return fitnesses
+
+
+@jit(nopython=True, cache=True)
+def deltaColumns(population, parents, previous, pool, references, freeSlots, possibleInputs, packedInputs):
+    # the output column of every active gate of every genome. Columns are kept in the rows of pool and every genome
+    # holds the slot of each of its gates, so a column that has not changed is shared with the parent rather than
+    # copied. previous holds the genomes, slots, outputs, unknown rows and active gate counts of the previous
+    # population, a negative count meaning nothing was kept for that individual. For a genome that differs from its
+    # parent only the gates the parent had no column for, the gates whose inputs differ and every gate downstream of
+    # those are evaluated. references counts the genomes using every slot and freeSlots[0] is the number of free slots,
+    # listed after it. Returns the slots, the packed output of every genome, the rows where it is unknown, its number of
+    # active gates and the number of gate columns evaluated
+    popSize, genomeLength = population.shape
+    size = genomeLength // 2
+    wordCount = packedInputs.shape[1]
+    previousGenomes, previousSlots, previousOutputs, previousUnknown, previousActive = previous
+    slots = np.full((popSize, size), -1, dtype=np.int64)
+    outputs = np.zeros((popSize, wordCount), dtype=np.uint64)
+    unknown = np.zeros((popSize, wordCount), dtype=np.uint64)
+    activeCounts = np.zeros(popSize, dtype=np.int64)
+    evaluated = 0
+    changed = np.zeros(size, dtype=np.bool_)
+    for n in range(popSize):
+        genome = population[n]
+        parent = parents[n]
+
+        changed[:] = False
+        anyChanged = False
+        for i in range(genomeLength):
+            if genome[i] != previousGenomes[parent, i]:
+                changed[i // 2] = True
+                anyChanged = True
+        if not anyChanged and previousActive[parent] >= 0:
+            for gate in range(size):
+                slot = previousSlots[parent, gate]
+                if slot >= 0:
+                    references[slot] += 1
+                slots[n, gate] = slot
+            outputs[n] = previousOutputs[parent]
+            unknown[n] = previousUnknown[parent]
+            activeCounts[n] = previousActive[parent]
+            continue
+
+        order, cyclic = NFunc.gateOrder(genome)
+        activeCounts[n] = len(order)
+
+        # the outcome of a cycle depends on the order in which resolve visits the gates, so these keep no columns
+        if cyclic:
+            table = NFunc.truthTable(genome, possibleInputs)
+            for i in range(len(possibleInputs)):
+                if table[i] == 1:
+                    outputs[n, i // 64] |= np.uint64(1) << np.uint64(i % 64)
+                elif table[i] != 0:
+                    unknown[n, i // 64] |= np.uint64(1) << np.uint64(i % 64)
+            continue
+
+        # the changed gates and every gate depending on them are evaluated again
+        stale = changed | NFunc.getDependents(genome, np.nonzero(changed)[0])
+        for gate in order:
+            slot = previousSlots[parent, gate] if previousActive[parent] >= 0 else -1
+            if stale[gate] or slot < 0:
+                slot = freeSlots[freeSlots[0]]
+                freeSlots[0] -= 1
+                k1 = genome[gate * 2]
+                k2 = genome[gate * 2 + 1]
+                for w in range(wordCount):
+                    if k1 < 0:
+                        input1 = packedInputs[-1 - k1, w]
+                    else:
+                        input1 = pool[slots[n, k1], w]
+                    if k2 < 0:
+                        input2 = packedInputs[-1 - k2, w]
+                    else:
+                        input2 = pool[slots[n, k2], w]
+                    pool[slot, w] = ~(input1 & input2)
+                evaluated += 1
+            references[slot] += 1
+            slots[n, gate] = slot
+        outputs[n] = pool[slots[n, 0]]
+
+    # the columns only the previous population used are freed
+    for parent in range(len(previousSlots)):
+        for gate in range(size):
+            slot = previousSlots[parent, gate]
+            if slot >= 0:
+                references[slot] -= 1
+                if references[slot] == 0:
+                    freeSlots[0] += 1
+                    freeSlots[freeSlots[0]] = slot
+    return slots, outputs, unknown, activeCounts, evaluated
+
+
+class IncrementalEvaluator(object):
+    # keeps the column of every active gate of the last population evaluated. Once told which individual of that
+    # population every individual of the next one descends from, through inherit, only the gates affected by the
+    # mutations are evaluated and the other columns are shared with the parent. Pass inherit as the lineage of
+    # runGeneration. The columns take up to 2 * popSize * length * rows / 8 bytes
+    def __init__(self, possibleInputs, packedInputs):
+        self.possibleInputs = possibleInputs
+        self.packedInputs = packedInputs
+        self.previous = None
+        self.parents = None
+        self.evaluated = 0
+        self.active = 0
+
+    def inherit(self, parents):
+        self.parents = parents
+
+    def reset(self, popSize, size, dtype=np.int64):
+        # empty the column pool, sized for the columns of two populations of genomes of type dtype
+        capacity = 2 * popSize * size
+        self.pool = np.zeros((capacity, self.packedInputs.shape[1]), dtype=np.uint64)
+        self.references = np.zeros(capacity, dtype=np.int64)
+        self.freeSlots = np.concatenate(([capacity], np.arange(capacity))).astype(np.int64)
+        wordCount = self.packedInputs.shape[1]
+        self.previous = (np.zeros((1, size * 2), dtype=dtype), np.full((1, size), -1, dtype=np.int64),
+                         np.zeros((1, wordCount), dtype=np.uint64), np.zeros((1, wordCount), dtype=np.uint64),
+                         np.full(1, -1, dtype=np.int64))
+
+    def evaluate(self, population):
+        # returns the packed output, the rows where it is unknown and the number of active gates of every genome
+        population = np.asarray(population)
+        parents = self.parents
+        if parents is None or self.previous is None or len(parents) != len(population) or \
+                self.previous[0].shape != population.shape or self.previous[0].dtype != population.dtype:
+            # without a lineage every column is evaluated
+            self.reset(len(population), population.shape[1] // 2, population.dtype)
+            parents = np.zeros(len(population), dtype=np.int64)
+
+        slots, outputs, unknown, activeCounts, evaluated = deltaColumns(
+            population, parents, self.previous, self.pool, self.references, self.freeSlots, self.possibleInputs,
+            self.packedInputs)
+        self.previous = (population, slots, outputs, unknown, activeCounts)
+        self.parents = None
+        self.evaluated += evaluated
+        self.active += np.sum(activeCounts)
+        return outputs, unknown, activeCounts
+
+    def fitness(self, population, target, sizeParam, cutoff):
+        # same result as populationFitness
+        outputs, unknown, activeCounts = self.evaluate(population)
+        return outputFitness(outputs, unknown, activeCounts, target, len(self.possibleInputs), sizeParam, cutoff)
+
+    def report(self):
+        return ("Incremental fitness: " + str(self.evaluated) + " of " + str(self.active) +
+                " active gate columns evaluated")
+
+
+def packTarget(requiredOutputs):
+    # pack the required outputs of every row into the word layout used by packInputs
+    return NFunc.packInputs(np.array(requiredOutputs, dtype=np.int64).reshape(-1, 1))[0]
+
+
+class FitnessCache(object):
+    # memoizes a batched fitness function. Only the unique genomes of a population are looked up, and those not yet seen
+    # for the goal are evaluated together. Results are kept across generations in a bounded LRU keyed on the goal and
+    # the genome, so goalKey must change whenever the fitness function does. maxSize=None switches the cache off, bind
+    # then returning the fitness function itself. Looking up a genome costs about as much as scoring it at 4 inputs, so
+    # the cache only pays off when scoring is expensive
+    def __init__(self, maxSize=int(1E6)):
+        self.maxSize = maxSize
+        self.cache = Caching.LRUCache(maxSize if maxSize is not None else 0)
+        self.requested = 0
+        self.evaluated = 0
+
+    def evaluate(self, population, goalKey, fitnessFunc):
+        unique, inverse = NFunc.uniqueRows(population)
+        self.requested += len(population)
+
+        # every unique genome is keyed on its bytes, sliced out of the bytes of the whole array
+        data = unique.tobytes()
+        step = unique.itemsize * unique.shape[1]
+        keys = [(goalKey, data[k:k + step]) for k in range(0, len(data), step)]
+        fitnesses = np.array(self.cache.getMany(keys), dtype=np.float64)
+        missing = np.nonzero(np.isnan(fitnesses))[0]
+
+        if len(missing) > 0:
+            fitnesses[missing] = fitnessFunc(unique[missing])
+            self.evaluated += len(missing)
+            self.cache.putMany([keys[i] for i in missing], fitnesses[missing].tolist())
+
+        return fitnesses[inverse]
+
+    def bind(self, goalKey, fitnessFunc):
+        # returns a batched fitness function that goes through the cache
+        if self.maxSize is None:
+            return fitnessFunc
+        return lambda population: self.evaluate(population, goalKey, fitnessFunc)
+
+    def report(self):
+        if self.maxSize is None:
+            return "Fitness cache: off"
+        return ("Fitness cache: " + str(self.cache.hits) + " hits, " + str(self.cache.misses) + " misses, " +
+                str(self.evaluated) + " of " + str(self.requested) + " genomes evaluated")
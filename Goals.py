@@ -0,0 +1,117 @@
+import ast
+import numpy as np
+import NetworkFunctions as NFunc
+import FitnessFunctions as FFunc
+
+# goals maps the name of a goal to its definition. A definition is one of:
+# - a python function taking the inputs of one row, e.g. lambda inputs: inputs[0] ^ inputs[1]
+# - a string of 0s and 1s giving the required output of every row, in the order of getPossibleInputs
+# - an expression in I1, I2... e.g. "I1 ^ I2 and I3 ^ I4"
+# the packed target of every goal is compiled once per inputCount and row sample and kept in compiledTargets
+goals = {}
+compiledTargets = {}
+possibleInputsCache = {}
+
+
+def registerGoal(name, definition):
+    # re-registering a name drops its compiled targets. Memoized fitness values are not dropped, so use a new name when
+    # the definition of a goal changes during a run
+    goals[name] = definition
+    for key in [key for key in compiledTargets if key[0] == name]:
+        del compiledTargets[key]
+
+
+def sampledRows(inputCount, sampleRows=None, seed=0):
+    # the indexes of the rows of the full truth table that are evaluated. Every row is evaluated if sampleRows is None
+    # or not below the number of rows, otherwise sampleRows distinct rows are drawn from seed, in order
+    rowCount = 2 ** inputCount
+    if sampleRows is None or sampleRows >= rowCount:
+        return np.arange(rowCount)
+    return np.sort(np.random.default_rng(seed).choice(rowCount, sampleRows, replace=False))
+
+
+def getPossibleInputs(inputCount, sampleRows=None, seed=0):
+    # every combination of inputs, starting from all ones, together with its packed columns. With sampleRows only a
+    # random sample of the combinations is kept, for networks with too many inputs to evaluate every one
+    key = (inputCount, sampleRows, seed)
+    if key not in possibleInputsCache:
+        # row r holds the bits of 2 ** inputCount - 1 - r, the first input being the most significant bit, which is the
+        # order of product([1, 0], repeat=inputCount)
+        values = 2 ** inputCount - 1 - sampledRows(inputCount, sampleRows, seed)
+        shifts = np.arange(inputCount - 1, -1, -1)
+        possibleInputs = ((values[:, None] >> shifts) & 1).astype(np.int8)
+        possibleInputsCache[key] = possibleInputs, NFunc.packInputs(possibleInputs)
+    return possibleInputsCache[key]
+
+
+class VectorizedBooleans(ast.NodeTransformer):
+    # rewrites an expression so that it can be evaluated on whole columns of inputs at once, and, or and not becoming
+    # elementwise operations on the truth of their operands
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        operator = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        result = self.truth(node.values[0])
+        for value in node.values[1:]:
+            result = ast.BinOp(left=result, op=operator, right=self.truth(value))
+        return result
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.Compare(left=node.operand, ops=[ast.Eq()], comparators=[ast.Constant(0)])
+        return node
+
+    @staticmethod
+    def truth(node):
+        return ast.Compare(left=node, ops=[ast.NotEq()], comparators=[ast.Constant(0)])
+
+
+def evaluateExpression(definition, possibleInputs):
+    # the output of an expression goal on every row, evaluated on whole columns and row by row if that fails, e.g. for
+    # expressions using chained comparisons or conditionals
+    tree = ast.parse(definition, "<goal>", "eval")
+    names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+    variables = dict(("I" + str(k + 1), possibleInputs[:, k].astype(np.int64)) for k in range(possibleInputs.shape[1])
+                     if "I" + str(k + 1) in names)
+    try:
+        vectorized = compile(ast.fix_missing_locations(VectorizedBooleans().visit(tree)), "<goal>", "eval")
+        outputs = np.broadcast_to(eval(vectorized, {"__builtins__": {}}, variables), len(possibleInputs))
+        return (outputs != 0).astype(int).tolist()
+    except Exception:
+        pass
+
+    expression = compile(definition, "<goal>", "eval")
+    outputs = []
+    for booleans in possibleInputs:
+        variables = dict(("I" + str(k + 1), int(value)) for k, value in enumerate(booleans))
+        outputs.append(int(bool(eval(expression, {"__builtins__": {}}, variables))))
+    return outputs
+
+
+def requiredOutputs(definition, inputCount, sampleRows=None, seed=0):
+    possibleInputs, _ = getPossibleInputs(inputCount, sampleRows, seed)
+    if callable(definition):
+        return [int(bool(definition(booleans))) for booleans in possibleInputs]
+
+    definition = definition.strip()
+    if set(definition) <= {"0", "1"} and len(definition) == 2 ** inputCount:
+        return [int(definition[r]) for r in sampledRows(inputCount, sampleRows, seed)]
+
+    return evaluateExpression(definition, possibleInputs)
+
+
+def getTarget(name, inputCount, sampleRows=None, seed=0):
+    # packed required outputs of the goal on the rows given by getPossibleInputs, compiled on first use
+    key = (name, inputCount, sampleRows, seed)
+    if key not in compiledTargets:
+        if name not in goals:
+            raise KeyError("No goal registered with name " + str(name))
+        compiledTargets[key] = FFunc.packTarget(requiredOutputs(goals[name], inputCount, sampleRows, seed))
+    return compiledTargets[key]
+
+
+# the goals used throughout
+# G1: x XOR y AND z XOR w
+# G2: x XOR y OR z XOR w
+registerGoal("G1", "I1 ^ I2 and I3 ^ I4")
+registerGoal("G2", "I1 ^ I2 or I3 ^ I4")
@@ -0,0 +1,232 @@
+import multiprocessing
+import queue
+import time
+import numpy as np
+import NetworkFunctions as NFunc
+import EvolutionFunctions as GAFunc
+import ParallelRunner as Runner
+import RunStorage
+import FitnessFunctions as FFunc
+import Goals
+
+# in island mode the population is split over islandCount subpopulations of islandSize individuals, each evolving in its
+# own process. Every migrationInterval generations every island sends copies of its migrantCount fittest individuals to
+# the islands it is connected to, where they replace the least fit. topology is "ring", "complete", "isolated" or a
+# list holding, for every island, the list of islands it sends to. With the modularGoals schedule the goal is switched
+# every epochLength generations
+islandCount = 4
+islandSize = 1000
+migrationInterval = 20
+epochLength = 20
+migrantCount = 10
+topology = "ring"
+
+# inputCount is the number of inputs the network takes
+# length is the number of gates encoded in the genome
+inputCount = 4
+length = 13
+# with many inputs, sampleRows scores networks on that many rows of the truth table, drawn once, instead of all of them
+sampleRows = None
+
+# simLength is the number of generations every island runs for
+# repetitions specifies how many runs are done, one after the other as every run already uses islandCount processes
+simLength = 2000
+repetitions = 10
+
+# output files are written to outputPath, make sure to change it together with the goal schedule. Island i of run j is
+# seeded from seed, j and i, a random seed is drawn and printed if seed is None
+outputPath = "Data/Islands/G1/"
+# outputFormat is either "binary", one compressed file per run, or "text", the original one file per quantity
+outputFormat = "binary"
+seed = None
+
+# to keep solutions small, a penalty of sizeParam is applied per gate above the cutoff
+sizeParam = 0.1
+cutoff = 11
+
+# modularity is adjusted for, using the values of Qmax and Qrand previously found. They are read from the parameter file
+# written by RandomModularity.py, the values given here are used for those missing from it
+Qmax, Qrand = NFunc.loadModularityParams(0.6435, 0.3523)
+
+# modularity values are memoized on the structure of the network and shared with other runs through a file
+modularityCachePath = "Data/Cache/ModularityCache.txt"
+modularityCache = NFunc.ModularityCache()
+modularityCache.load(modularityCachePath)
+
+# config is a dictionary with the probability of each mutation and the fraction of top fitness individuals considered
+# elite, as in the other experiments. Islands always score their whole population in one call
+config = dict([("mutation weights", [0.3, 0.05, 0.05, 0.25, 0.35]), ("elite fraction", 0.3),
+               ("batched fitness", True)])
+
+# fitness values are memoized per goal on every island, keeping at most cacheSize genomes across generations. At 4
+# inputs scoring a population directly is faster than looking it up, so the cache is off with cacheSize None
+cacheSize = None
+
+
+# the goal of every generation i is named by a schedule function, passed i and epochLength. It is sent to the island
+# processes, so it has to be defined at module level
+def fixedGoal(i, epochLength):
+    return "G1"
+
+
+def modularGoals(i, epochLength):
+    # the goal alternation of ModularGoals.py
+    if i % epochLength * 2 < epochLength:
+        return "G1"
+    return "G2"
+
+
+goalSchedule = fixedGoal
+
+
+def modularitySums(population, fitnesses):
+    # the sum, sum of squares and number of adjusted modularities of the fitness 1 networks, so that islands can be
+    # pooled into a mean and standard deviation
+    examined = population[fitnesses == 1]
+    modularityArray = modularityCache.populationModularity(examined, Qmax, Qrand)
+    return np.sum(modularityArray), np.sum(modularityArray ** 2), len(examined)
+
+
+def neighbours(topology, islandCount):
+    # the islands every island sends its migrants to
+    if topology == "ring":
+        return [[(i + 1) % islandCount] if islandCount > 1 else [] for i in range(islandCount)]
+    if topology == "complete":
+        return [[k for k in range(islandCount) if k != i] for i in range(islandCount)]
+    if topology == "isolated":
+        return [[] for i in range(islandCount)]
+    if isinstance(topology, list) and len(topology) == islandCount:
+        return topology
+    raise ValueError("Unknown topology " + str(topology))
+
+
+def evolveIsland(island, settings, outputs, inputs, results):
+    # run one island for settings["generations"] generations, exchanging migrants through the queues in outputs and
+    # inputs, and put its history on the results queue
+    Runner.seedRepetition(settings["seed"], settings["run"], island)
+    possibleInputs, packedInputs = Goals.getPossibleInputs(settings["inputCount"], settings["sampleRows"])
+    fitnessCache = FFunc.FitnessCache(settings["cacheSize"])
+    goalFitness = {}
+
+    def getFitness(goalName):
+        if goalName not in goalFitness:
+            target = Goals.getTarget(goalName, settings["inputCount"], settings["sampleRows"])
+            goalFitness[goalName] = fitnessCache.bind(goalName, lambda x: FFunc.populationFitness(
+                x, target, possibleInputs, packedInputs, settings["sizeParam"], settings["cutoff"]))
+        return goalFitness[goalName]
+
+    generations = settings["generations"]
+    history = np.full(generations, np.nan)
+    geneDtype = NFunc.geneDtype(settings["length"], settings["inputCount"])
+    winners = np.zeros((generations, settings["length"] * 2), dtype=geneDtype)
+    reports = np.zeros((generations, 3))
+    population = NFunc.randomPopulation(settings["islandSize"], settings["length"], settings["inputCount"])
+    for i in range(generations):
+        fitnessFunc = getFitness(settings["goalSchedule"](i, settings["epochLength"]))
+        population, history[i], winners[i], reports[i] = \
+            GAFunc.runGeneration(population, fitnessFunc, settings["reporter"], settings["config"],
+                                 inputCount=settings["inputCount"])
+        population = np.asarray(population)
+
+        if (i + 1) % settings["migrationInterval"] == 0 and (outputs or inputs):
+            ranking = np.argsort(fitnessFunc(population))
+            # putting on a queue returns at once, the migrants being written by a background thread, so islands never
+            # block one another however large the migrants are
+            for connection in outputs:
+                connection.put(population[ranking[-settings["migrantCount"]:]])
+            migrants = [connection.get() for connection in inputs]
+            if migrants:
+                migrants = np.concatenate(migrants)[:len(population)]
+                population[ranking[:len(migrants)]] = migrants
+
+    modularityCache.save(modularityCachePath)
+    results.put((island, history, winners, reports))
+
+
+def compileFunctions(settings):
+    # evolve a small population for a generation so that forked islands inherit the compiled functions rather than each
+    # compiling them again
+    possibleInputs, packedInputs = Goals.getPossibleInputs(settings["inputCount"], settings["sampleRows"])
+    goalName = settings["goalSchedule"](0, settings["epochLength"])
+    target = Goals.getTarget(goalName, settings["inputCount"], settings["sampleRows"])
+    population = NFunc.randomPopulation(10, settings["length"], settings["inputCount"])
+    GAFunc.runGeneration(population, lambda x: FFunc.populationFitness(
+        x, target, possibleInputs, packedInputs, settings["sizeParam"], settings["cutoff"]), settings["reporter"],
+        settings["config"], inputCount=settings["inputCount"])
+
+
+def runIslands(settings, topology, islandCount):
+    # evolve islandCount islands in parallel and return the fitness history, winners and reports of every island
+    destinations = neighbours(topology, islandCount)
+    outputs = [[] for i in range(islandCount)]
+    inputs = [[] for i in range(islandCount)]
+    for i in range(islandCount):
+        for k in destinations[i]:
+            connection = multiprocessing.Queue()
+            outputs[i].append(connection)
+            inputs[k].append(connection)
+
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=evolveIsland, args=(i, settings, outputs[i], inputs[i], results))
+               for i in range(islandCount)]
+    for worker in workers:
+        worker.start()
+    # the results are collected before joining, as a process does not exit until its results are taken off the queue.
+    # An island that crashed never sends its results and leaves the others waiting for its migrants, so the workers are
+    # checked while waiting and all of them are stopped if one failed
+    collected = []
+    while len(collected) < islandCount:
+        try:
+            collected.append(results.get(timeout=1))
+        except queue.Empty:
+            failed = [i for i, worker in enumerate(workers) if worker.exitcode not in (None, 0)]
+            if failed:
+                for worker in workers:
+                    worker.terminate()
+                raise RuntimeError("Island " + str(failed[0]) + " exited with code " +
+                                   str(workers[failed[0]].exitcode))
+    collected.sort(key=lambda result: result[0])
+    for worker in workers:
+        worker.join()
+
+    histories = np.array([history for island, history, winners, reports in collected])
+    winners = np.array([winners for island, history, winners, reports in collected])
+    reports = np.array([reports for island, history, winners, reports in collected])
+    return histories, winners, reports
+
+
+def runRepetition(j, seed):
+    settings = dict(run=j, seed=seed, generations=simLength, inputCount=inputCount, sampleRows=sampleRows,
+                    length=length, islandSize=islandSize, migrationInterval=migrationInterval, epochLength=epochLength,
+                    migrantCount=migrantCount, sizeParam=sizeParam, cutoff=cutoff, cacheSize=cacheSize, config=config,
+                    goalSchedule=goalSchedule, reporter=modularitySums)
+    compileFunctions(settings)
+    histories, islandWinners, reports = runIslands(settings, topology, islandCount)
+
+    # the run is recorded as one population, taking the fittest island of every generation and pooling the modularity of
+    # the fitness 1 networks of all islands
+    bestIslands = np.argmax(histories, axis=0)
+    history = histories.max(axis=0)
+    winners = islandWinners[bestIslands, np.arange(simLength)]
+    modularitySum, squareSum, count = reports.sum(axis=0).T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        modularities = modularitySum / count
+        modularityStdDev = np.sqrt(np.maximum(squareSum / count - modularities ** 2, 0))
+
+    metadata = dict(config, experiment="Islands", run=j, inputCount=inputCount, length=length, islandCount=islandCount,
+                    islandSize=islandSize, migrationInterval=migrationInterval, migrantCount=migrantCount,
+                    topology=topology, goalSchedule=goalSchedule.__name__, epochLength=epochLength, sizeParam=sizeParam,
+                    cutoff=cutoff, sampleRows=sampleRows, seed=seed)
+    RunStorage.writeRun(outputPath, str(j), history, modularities, modularityStdDev, winners, metadata, outputFormat)
+
+
+if __name__ == "__main__":
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    print("Seed: " + str(seed))
+    for j in range(repetitions):
+        t1 = time.perf_counter()
+        runRepetition(j, seed)
+        t2 = time.perf_counter()
+        print("Finished run " + str(j + 1) + " in " + str(t2 - t1) + " s. Throughput: " +
+              str(islandCount * simLength / (t2 - t1)) + " island generations per second")
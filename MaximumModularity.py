@@ -3,6 +3,10 @@ from itertools import product
 import time
 import NetworkFunctions as NFunc
 import EvolutionFunctions as GAFunc
+import ParallelRunner as Runner
+import RunStorage
+import Checkpointing
+import Profiling
 
 # inputCount is the number of inputs the network takes
 # length is the number of gates encoded in the genome
@@ -19,21 +23,43 @@ simLength = int(1E4)
 repetitions = 10
 period = 10
 
+# output files are written to outputPath
+# repetitions are spread over a pool of processes, None uses every core. Run j is seeded from seed and j, a random
+# seed is drawn and printed if seed is None
+outputPath = "Data/AdjustedModularityParams/Qmax/"
+# outputFormat is either "binary", one compressed file per run, or "text", the original one file per quantity
+outputFormat = "binary"
+processes = None
+seed = None
+# the state of every run is saved every checkpointInterval seconds so it can be resumed after a crash, None disables it
+checkpointInterval = 300
+# the wall time and calls of every phase of the loop are appended to timingPath as one JSON record every period
+# generations, None switches the timings off
+timingPath = None
+
 # to keep solutions small, a penalty of sizeParam is applied per gate above the cutoff
 sizeParam = 0.1
 cutoff = 11
 
+# modularity values are memoized on the structure of the network and shared with other runs through a file
+modularityCachePath = "Data/Cache/ModularityCache.txt"
+modularityCache = NFunc.ModularityCache()
+modularityCache.load(modularityCachePath)
+
 # config is a dictionary with the probability of each mutation and the fraction of top fitness individuals considered
 # elite. These pass on to the next generation unmutatated and then reproduce. The weights correspond, in order, to:
 # no mutation - new gate - gate deletion - switch of inputs - crossover
-config = dict([("mutation weights", [0.3, 0.05, 0.05, 0.25, 0.35]), ("elite fraction", 0.3)])
+# with batched fitness the fitness function is passed the whole population and returns all fitnesses at once
+config = dict([("mutation weights", [0.3, 0.05, 0.05, 0.25, 0.35]), ("elite fraction", 0.3),
+               ("batched fitness", True)])
 
 # this was used to find Qmax
-# to preserve the connectivity of the network to the 0 output, a penalty is applied from departure from it
-def modularityFitness(genome):
-    modularity = NFunc.getModularity(genome)
-    prec = sum(NFunc.getPrecursors(genome))
-    penalty = max(11-prec, 0)
+# to preserve the connectivity of the network to the 0 output, a penalty is applied from departure from it. The
+# modularity of the whole population is measured in one call
+def modularityFitness(population):
+    modularity = modularityCache.populationModularity(population)
+    prec = NFunc.populationPrecursors(population).sum(axis=1)
+    penalty = np.maximum(11-prec, 0)
 
     return modularity-penalty
 
@@ -43,24 +69,34 @@ def averageModularity(population, fitnesses):
     return mean, stdDev
 
 
-for j in range(repetitions):
-    # initiate random generation of networks of a certain length
-    generation = np.array([NFunc.randomNetwork(length, inputCount) for i in range(popSize)])
-
+def runRepetition(j):
     # these will store the data collected throughout
     history = np.full(simLength, np.nan)
     modularities = np.full(simLength, np.nan)
     modularityStdDev = np.full(simLength, np.nan)
-    winners = np.full((simLength, length * 2), np.nan)
+    winners = np.zeros((simLength, length * 2), dtype=NFunc.geneDtype(length, inputCount))
+
+    # resume from the last checkpoint of the run if there is one, otherwise initiate random generation of networks of a
+    # certain length
+    checkpoint = Checkpointing.Checkpointer(outputPath + "Checkpoints/Checkpoint" + str(j) + ".pkl", checkpointInterval)
+    state = checkpoint.load()
+    if state is None:
+        generation = NFunc.randomPopulation(popSize, length, inputCount)
+        start = 0
+    else:
+        generation, start = state["generation"], state["i"]
+        history[:start], winners[:start] = state["history"], state["winners"]
+        modularities[:start], modularityStdDev[:start] = state["modularities"], state["modularityStdDev"]
 
     i = 0
-    terminate = False
+    timer = Profiling.getTimer(timingPath)
+    timer.start()
     t1 = time.perf_counter()
-    for i in range(simLength):
+    for i in range(start, simLength):
         # here the fixed goal is specified, make sure to also change the destination of the data
         goal = modularityFitness
         generation, history[i], winners[i], (modularities[i], modularityStdDev[i]) = \
-            GAFunc.runGeneration(generation, goal, averageModularity, config)
+            GAFunc.runGeneration(generation, goal, averageModularity, config, timer, inputCount=inputCount)
 
         # broadcast progress every period generations
         if i % period == 0:
@@ -68,19 +104,32 @@ for j in range(repetitions):
             print("Run: " + str(j+1) + ". Generation " + str(i) + ".")
             print("Fitness: " + str(history[i]))
             print("Time per generation: " + str((t2 - t1) / period))
+            print(modularityCache.report())
             t1 = time.perf_counter()
+            timer.lap("broadcast")
+            timer.write(experiment="MaximumModularity", run=j, generation=i)
+
+        # save the state of the run every checkpointInterval seconds
+        if i + 1 < simLength and checkpoint.due():
+            checkpoint.save(generation=generation, i=i + 1,
+                            history=history[:i + 1], modularities=modularities[:i + 1],
+                            modularityStdDev=modularityStdDev[:i + 1], winners=winners[:i + 1])
+            timer.lap("checkpoint")
+
+    # save all data to the appropiate files, together with the parameters of the run
+    metadata = dict(config, experiment="MaximumModularity", run=j, inputCount=inputCount, length=length,
+                    popSize=popSize, sizeParam=sizeParam, cutoff=cutoff, seed=seed)
+    RunStorage.writeRun(outputPath, str(j), history[:i], modularities, modularityStdDev,
+                        winners[:i], metadata, outputFormat, fitnessName="Fitnesses")
+
+    modularityCache.save(modularityCachePath)
+    checkpoint.clear()
+    timer.lap("output")
+    timer.write(experiment="MaximumModularity", run=j, generation=i)
 
-    # save all data to the appropiate files
-    with open("Data/AdjustedModularityParams/Qmax/Networks/Networks" + str(j) + ".txt", "w") as outputFile:
-        networkStrings = [",".join([str(k) for k in network]) for network in winners[:i]]
-        outputString = "\n".join(networkStrings)
-        outputFile.write(outputString)
+    # generations resumed from the checkpoint are not counted towards the throughput of this launch
+    return simLength - start
 
-    with open("Data/AdjustedModularityParams/Qmax/Fitnesses/Fitnesses" + str(j) + ".txt", "w") as outputFile:
-        outputString = "\n".join([str(k) for k in history[:i]])
-        outputFile.write(outputString)
 
-    with open("Data/AdjustedModularityParams/Qmax/Modularity/Modularity" + str(j) + ".txt", "w") as outputFile:
-        dataStrings = [str(value) + ", " + str(stdDev) for value, stdDev in zip(modularities, modularityStdDev)]
-        outputString = "\n".join(dataStrings)
-        outputFile.write(outputString)
\ No newline at end of file
+if __name__ == "__main__":
+    Runner.runRepetitions(runRepetition, repetitions, processes, seed)
@@ -1,14 +1,22 @@
 import numpy as np
-from itertools import product
 import time
 import NetworkFunctions as NFunc
 import EvolutionFunctions as GAFunc
+import ParallelRunner as Runner
+import RunStorage
+import Checkpointing
+import Profiling
+import Reporting
+import FitnessFunctions as FFunc
+import Goals
 import random
 
 # inputCount is the number of inputs the network takes
 # length is the number of gates encoded in the genome
 inputCount = 4
 length = 13
+# with many inputs, sampleRows scores networks on that many rows of the truth table, drawn once, instead of all of them
+sampleRows = None
 
 # popSize is the number of individuals per generation
 # simLength the maximum number of generations at which the simulation will be halted
@@ -21,115 +29,196 @@ simLength = 5000
 consecutiveSolutions = 20
 repetitions = 20
 period = 10
-samplingPeriod = 100
+
+# output files are written to outputPath
+# repetitions are spread over a pool of processes, None uses every core. Run j is seeded from seed and j, a random
+# seed is drawn and printed if seed is None
+outputPath = "Data/ModularityDecay/"
+# outputFormat is either "binary", one compressed file per run, or "text", the original one file per quantity
+outputFormat = "binary"
+processes = None
+seed = None
+# the state of every run is saved every checkpointInterval seconds so it can be resumed after a crash, None disables it
+checkpointInterval = 300
+# the wall time and calls of every phase of the loop are appended to timingPath as one JSON record every period
+# generations, None switches the timings off
+timingPath = None
+# the modularity of the population is measured in reporterThreads background threads while the evolution carries on.
+# It is measured every reportPeriod generations on at most reportSampleSize networks, None measures all of them
+reportPeriod = 100
+reportSampleSize = None
+reporterThreads = 1
 
 # to keep solutions small, a penalty of sizeParam is applied per gate above the cutoff
 sizeParam = 0.2
 cutoff = 11
 
-# modularity is adjusted for, using the values of Qmax and Qrand previously found
-Qmax = 0.6435
-Qrand = 0.3523
+# modularity is adjusted for, using the values of Qmax and Qrand previously found. They are read from the parameter file
+# written by RandomModularity.py, the values given here are used for those missing from it
+Qmax, Qrand = NFunc.loadModularityParams(0.6435, 0.3523)
+
+# modularity values are memoized on the structure of the network and shared with other runs through a file
+modularityCachePath = "Data/Cache/ModularityCache.txt"
+modularityCache = NFunc.ModularityCache()
+modularityCache.load(modularityCachePath)
 
 # config is a dictionary with the probability of each mutation and the fraction of top fitness individuals considered
 # elite. These pass on to the next generation unmutatated and then reproduce. The weights correspond, in order, to:
 # no mutation - new gate - gate deletion - switch of inputs - crossover
-config = dict([("mutation weights", [0.3, 0.05, 0.05, 0.25, 0.35]), ("elite fraction", 0.3)])
+# with batched fitness the fitness function is passed the whole population and returns all fitnesses at once
+config = dict([("mutation weights", [0.3, 0.05, 0.05, 0.25, 0.35]), ("elite fraction", 0.3),
+               ("batched fitness", True)])
 
 
-# the two goals are defined
+# the goals G1 and G2 are defined in the goal registry, which compiles their required outputs once
 # G1: x XOR y AND z XOR w
 # G2: x XOR y OR z XOR w
-def g1(inputs):
-    return inputs[0] ^ inputs[1] and inputs[2] ^ inputs[3]
+goalNames = ["G1", "G2"]
+possibleInputs, packedInputs = Goals.getPossibleInputs(inputCount, sampleRows)
+
+# fitness values are memoized per goal, keeping at most cacheSize genomes across generations. At 4 inputs scoring a
+# population directly is faster than looking it up, so the cache is off with cacheSize None
+cacheSize = None
+fitnessCache = FFunc.FitnessCache(cacheSize)
+
 
+# booleanFitness takes in the name of a registered goal and scores the whole population in one call
+def booleanFitness(population, goalName):
+    # return the fitness of every network given by the % similarity across all inputs with the goal minus a size penalty
+    target = Goals.getTarget(goalName, inputCount, sampleRows)
+    return FFunc.populationFitness(population, target, possibleInputs, packedInputs, sizeParam, cutoff)
 
-def g2(inputs):
-    return inputs[0] ^ inputs[1] or inputs[2] ^ inputs[3]
 
+# the fitness function of every goal is built once
+goalFitness = dict((name, fitnessCache.bind(name, lambda x, name=name: booleanFitness(x, name))) for name in goalNames)
 
-# booleanFitness takes in a function as argument, which defines what the target outputs are
-def booleanFitness(genome, func, possibleInputs=np.array(list(product([1, 0], repeat=inputCount)))):
-    # return the fitness of a network given by the % similarity across all inputs with func minus a size penalty
+# with incrementalFitness every individual keeps the output columns of its gates, and only the gates affected by its
+# mutations are evaluated again, in place of going through fitnessCache. It pays off with many inputs
+incrementalFitness = False
+evaluator = FFunc.IncrementalEvaluator(possibleInputs, packedInputs)
+incrementalGoalFitness = dict((name, lambda x, name=name: evaluator.fitness(
+    x, Goals.getTarget(name, inputCount, sampleRows), sizeParam, cutoff)) for name in goalNames)
 
-    # first find the required outputs
-    requiredOutputs = [func(booleans) for booleans in possibleInputs]
-    # then compare with the outputs of the network
-    correct = np.equal(requiredOutputs, NFunc.truthTable(genome, possibleInputs))
+# with compiledGenerations set, the population is advanced that many generations at a time by a compiled loop that
+# scores, selects and mutates without returning to python, in place of the fitness functions above. The modularity is
+# still measured every reportPeriod generations. The compiled loop draws other random numbers than runGeneration does
+compiledGenerations = None
+goalTargets = np.array([Goals.getTarget(name, inputCount, sampleRows) for name in goalNames])
 
-    accuracy = np.count_nonzero(correct) / len(possibleInputs)
-    sizePenalty = sizeParam * max(0, sum(NFunc.getPrecursors(genome)) - cutoff)
 
-    return accuracy - sizePenalty
+def goalIndex(i):
+    # here the fixed goal is specified, as its position in goalNames
+    return 1
 
 
 def averageModularity(population, fitnesses):
-    modularityArray = np.array([NFunc.adjustedModularity(specimen, Qmax, Qrand) for specimen in population])
+    modularityArray = modularityCache.populationModularity(population, Qmax, Qrand)
     mean = np.mean(modularityArray)
     stdDev = np.std(modularityArray)
 
     return mean, stdDev
 
 
-def doNothing(a, b):
-    return np.nan, np.nan
-
-
-def getNetworks(path, networkNumb, amount):
-    with open(path + "/Networks" + str(networkNumb) + ".txt") as network:
-        finalNetwork = np.array(network.readlines()[-1].split(","))
-        # remove the decimal point and trailing zero from the string before turning into an integer
-        finalNetwork = np.array([int(i[:-2]) for i in finalNetwork])
+def getNetworks(directory, networkNumb, amount):
+    # the final network of the run, stored in either format
+    finalNetwork = RunStorage.readNetworks(directory, str(networkNumb))[-1].astype(NFunc.geneDtype(length, inputCount))
 
     # cycle through those networks until the given amount is achieved
     outputNetworks = np.resize(np.tile(finalNetwork, amount), (amount, length*2))
     return outputNetworks
 
 
-for j in range(0, repetitions):
-    # initiate the network with number networkID
+def runRepetition(j):
     networkID = 4
-    generation = getNetworks("Data/ModularGoals/Networks", networkID, 1000)
-
     # these will store the data collected throughout
     history = np.full(simLength, np.nan)
     modularities = np.full(simLength, np.nan)
     modularityStdDev = np.full(simLength, np.nan)
-    winners = np.full((simLength, length * 2), np.nan)
-
+    winners = np.zeros((simLength, length * 2), dtype=NFunc.geneDtype(length, inputCount))
+
+    # resume from the last checkpoint of the run if there is one, otherwise initiate the network with number networkID
+    checkpointPath = outputPath + "Checkpoints/Checkpoint" + str(networkID) + "-" + str(j) + ".pkl"
+    checkpoint = Checkpointing.Checkpointer(checkpointPath, checkpointInterval)
+    state = checkpoint.load()
+    if state is None:
+        generation = getNetworks("Data/ModularGoals/", networkID, 1000)
+        start = 0
+    else:
+        generation, start = state["generation"], state["i"]
+        history[:start], winners[:start] = state["history"], state["winners"]
+        modularities[:start], modularityStdDev[:start] = state["modularities"], state["modularityStdDev"]
+
+    goals = incrementalGoalFitness if incrementalFitness else goalFitness
+    reporter = Reporting.AsyncReporter(averageModularity, reportPeriod, reportSampleSize, None,
+                                       reporterThreads, (np.nan, np.nan), Runner.runGenerator())
+    if state is not None:
+        # the reporter samples from where it stopped
+        reporter.random.bit_generator.state = state["reporterState"]
+    timer = Profiling.getTimer(timingPath)
+    timer.start()
     t1 = time.perf_counter()
-    for i in range(simLength):
-        # sample the population modularity once every samplingPeriod generations
-        if i % samplingPeriod == 0:
-            introspectionFunction = averageModularity
-        if i % samplingPeriod == 1:
-            introspectionFunction = doNothing
-
-        # here the fixed goal is specified
-        goal = lambda x: booleanFitness(x, g2)
-        generation, history[i], winners[i], (modularities[i], modularityStdDev[i]) = \
-            GAFunc.runGeneration(generation, goal, introspectionFunction, config)
-
-        # broadcast progress every period generations
-        if i % period == 0:
-            t2 = time.perf_counter()
-            print("Run: " + str(j+1) + ". Generation " + str(i) + ".")
-            print("Fitness: " + str(history[i]))
-            print("Time per generation: " + str((t2 - t1) / period))
-            t1 = time.perf_counter()
-
-
-    # save all data to the appropiate files
-    with open("Data/ModularityDecay/Networks/Networks" + str(networkID) + "-" + str(j) + ".txt", "w") as outputFile:
-        networkStrings = [",".join([str(k) for k in network]) for network in winners[:i]]
-        outputString = "\n".join(networkStrings)
-        outputFile.write(outputString)
-
-    with open("Data/ModularityDecay/Fitness/Fitness" + str(networkID) + "-" + str(j) + ".txt", "w") as outputFile:
-        outputString = "\n".join([str(k) for k in history[:i]])
-        outputFile.write(outputString)
-
-    with open("Data/ModularityDecay/Modularity/Modularity" + str(networkID) + "-" + str(j) + ".txt", "w") as outputFile:
-        dataStrings = [str(value) + ", " + str(stdDev) for value, stdDev in zip(modularities[:i], modularityStdDev[:i])]
-        outputString = "\n".join(dataStrings)
-        outputFile.write(outputString)
+    i = start
+    while i < simLength:
+        if compiledGenerations is None:
+            steps = 1
+            generation, history[i], winners[i], _ = GAFunc.runGeneration(
+                generation, goals[goalNames[goalIndex(i)]],
+                lambda population, fitnesses: reporter.submit(i, population, fitnesses), config, timer,
+                evaluator.inherit, inputCount)
+        else:
+            steps = min(compiledGenerations, simLength - i)
+            generation, history[i:i + steps], winners[i:i + steps], reports = GAFunc.runGenerations(
+                generation, goalTargets, [goalIndex(k) for k in range(i, i + steps)], config, inputCount,
+                possibleInputs, packedInputs, sizeParam, cutoff, np.arange(i, i + steps) % reportPeriod == 0, timer)
+            for k, population, fitnesses in reports:
+                reporter.submit(i + k, population, fitnesses)
+        # the modularity measured in the background is filled in once it is ready
+        reporter.collect((modularities, modularityStdDev))
+
+        for i in range(i, i + steps):
+            # broadcast progress every period generations
+            if i % period == 0:
+                t2 = time.perf_counter()
+                print("Run: " + str(j+1) + ". Generation " + str(i) + ".")
+                print("Fitness: " + str(history[i]))
+                print("Time per generation: " + str((t2 - t1) / period))
+                print(modularityCache.report())
+                print(evaluator.report() if incrementalFitness else fitnessCache.report())
+                t1 = time.perf_counter()
+                timer.lap("broadcast")
+                timer.write(experiment="ModularityDecay", run=j, generation=i)
+
+        # save the state of the run every checkpointInterval seconds
+        if i + 1 < simLength and checkpoint.due():
+            reporter.collect((modularities, modularityStdDev), wait=True)
+            checkpoint.save(generation=generation, i=i + 1,
+                            history=history[:i + 1], modularities=modularities[:i + 1],
+                            modularityStdDev=modularityStdDev[:i + 1], winners=winners[:i + 1],
+                            reporterState=reporter.random.bit_generator.state)
+            timer.lap("checkpoint")
+
+        i += 1
+
+    reporter.collect((modularities, modularityStdDev), wait=True)
+    reporter.close()
+
+    # save all data to the appropiate files, together with the parameters of the run
+    metadata = dict(config, experiment="ModularityDecay", run=j, inputCount=inputCount, length=length, popSize=popSize,
+                    sizeParam=sizeParam, cutoff=cutoff, sampleRows=sampleRows, seed=seed)
+    # as in the original for loop, the last generation is left out of the output, so runs keep the simLength - 1
+    # generations DataProcessing reads
+    recorded = simLength - 1
+    RunStorage.writeRun(outputPath, str(networkID) + "-" + str(j), history[:recorded], modularities[:recorded],
+                        modularityStdDev[:recorded], winners[:recorded], metadata, outputFormat)
+
+    modularityCache.save(modularityCachePath)
+    checkpoint.clear()
+    timer.lap("output")
+    timer.write(experiment="ModularityDecay", run=j, generation=i)
+
+    # generations resumed from the checkpoint are not counted towards the throughput of this launch
+    return i - start
+
+
+if __name__ == "__main__":
+    Runner.runRepetitions(runRepetition, repetitions, processes, seed)
@@ -0,0 +1,27 @@
+import numpy as np
+import glob
+import NetworkFunctions as NFunc
+
+# compares the compiled modularity engines with networkx on the networks stored in the data folder
+# every sampleStep-th network out of the last samples of every run is checked
+samples = 400
+sampleStep = 10
+engines = ["cnm", "louvain"]
+tolerance = 1E-9
+
+paths = sorted(glob.glob("Data/**/Networks*.txt", recursive=True))
+genomes = []
+for path in paths:
+    with open(path) as file:
+        lines = file.readlines()
+    for line in lines[-samples::sampleStep]:
+        genomes.append(np.array([int(float(k)) for k in line.split(",")]))
+
+reference = np.array([NFunc.getModularity(genome, "networkx") for genome in genomes])
+print("Checked " + str(len(genomes)) + " networks from " + str(len(paths)) + " files")
+for engine in engines:
+    modularities = np.array([NFunc.getModularity(genome, engine) for genome in genomes])
+    difference = np.abs(modularities - reference)
+    print(engine + ": largest difference " + str(np.max(difference)) + ", " +
+          str(np.count_nonzero(difference > tolerance)) + " networks differ, mean difference " +
+          str(np.mean(modularities - reference)))
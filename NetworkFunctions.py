@@ -1,114 +1,321 @@
 import numpy as np
 import random
+import os
+import fcntl
+import hashlib
+import json
 from numba import jit
-import networkx as nx
-from networkx.algorithms import community
+import Caching
 
-inputCount = 4
+# the number of inputs assumed by the functions that lay out inputs next to gates when none is passed
+defaultInputCount = 4
 
-@jit(nopython=True)
-def resolve(numb, genome, inputs, computed=None):
-    # compute the output of numb given a network described by genome and some inputs. Output 2 or 3 if state is unknown
-    if computed is None:
-        computed = [2] * (len(genome) // 2)
+# compiled functions are cached on disk in __pycache__, so only the first launch after a change compiles them. The cache
+# of a function is not refreshed when a compiled function it calls from another module changes, clear __pycache__ after
+# editing those
+
+
+@jit(nopython=True, cache=True)
+def resolveWith(numb, genome, inputs, computed, stackGates, stackPhases, firstInputs):
+    # resolve with the state of every gate in computed and the stack arrays, each of at least one entry per gate, passed
+    # in so that they can be reused across rows. Gates are visited depth first in the same order as a recursive
+    # evaluation would, keeping the path on an explicit stack so that long genomes do not run out of stack
     if numb < 0:
-        return inputs[-1 + numb * -1]
-    elif computed[numb] == 2:
-        computed[numb] = 3
-        input1 = resolve(genome[numb * 2], genome, inputs, computed)
-        if input1 == 0:
-            computed[numb] = 1
+        return inputs[-1 - numb]
+    if computed[numb] != 2:
+        return computed[numb]
+
+    computed[numb] = 3
+    stackGates[0] = numb
+    stackPhases[0] = 0
+    depth = 1
+    value = 0
+    while depth > 0:
+        gate = stackGates[depth - 1]
+        phase = stackPhases[depth - 1]
+        if phase == 0:
+            k = genome[gate * 2]
+        elif phase == 1:
+            # value holds the first input
+            firstInputs[depth - 1] = value
+            if value == 0:
+                computed[gate] = 1
+                depth -= 1
+                value = computed[gate]
+                continue
+            k = genome[gate * 2 + 1]
+        else:
+            # value holds the second input
+            if value == 0:
+                computed[gate] = 1
+            elif firstInputs[depth - 1] == 1 and value == 1:
+                computed[gate] = 0
+            depth -= 1
+            value = computed[gate]
+            continue
+
+        stackPhases[depth - 1] = phase + 1
+        if k < 0:
+            value = inputs[-1 - k]
+        elif computed[k] != 2:
+            value = computed[k]
         else:
-            input2 = resolve(genome[numb * 2 + 1], genome, inputs, computed)
-            if input2 == 0:
-                computed[numb] = 1
-            elif input1 == 1 and input2 == 1:
-                computed[numb] = 0
-    return computed[numb]
-
-# function can be written as map or list comprehension but is written as for loop for compatibility with numba
-@jit(nopython=True)
+            computed[k] = 3
+            stackGates[depth] = k
+            stackPhases[depth] = 0
+            depth += 1
+    return value
+
+
+@jit(nopython=True, cache=True)
+def resolve(numb, genome, inputs):
+    # compute the output of numb given a network described by genome and some inputs. Output 2 or 3 if state is unknown
+    size = len(genome) // 2
+    computed = np.full(size, 2, dtype=np.int64)
+    return resolveWith(numb, genome, inputs, computed, np.empty(size, dtype=np.int64), np.empty(size, dtype=np.int64),
+                       np.empty(size, dtype=np.int64))
+
+
+@jit(nopython=True, cache=True)
 def truthTable(genome, possibleInputs):
     # calculate the output for every possible input
+    size = len(genome) // 2
+    computed = np.empty(size, dtype=np.int64)
+    stackGates = np.empty(size, dtype=np.int64)
+    stackPhases = np.empty(size, dtype=np.int64)
+    firstInputs = np.empty(size, dtype=np.int64)
     results = np.full(len(possibleInputs), np.nan)
     for i in range(len(possibleInputs)):
-        results[i] = resolve(0, genome, possibleInputs[i])
+        computed[:] = 2
+        results[i] = resolveWith(0, genome, possibleInputs[i], computed, stackGates, stackPhases, firstInputs)
     return results
 
 
+@jit(nopython=True, cache=True)
+def gateOrder(genome):
+    # iterative depth first search from gate 0. Returns the gates connected to gate 0 ordered so that every gate comes
+    # after its inputs, and whether a cycle was found among them
+    size = len(genome) // 2
+    # 0 is unvisited, 1 is on the current path and 2 is finished
+    state = np.zeros(size, dtype=np.int8)
+    order = np.empty(size, dtype=np.int64)
+    stackGates = np.empty(size, dtype=np.int64)
+    stackInputs = np.empty(size, dtype=np.int64)
+    orderLength = 0
+    cyclic = False
 
-def getDependents(genome, numbs, visited=None):
-    # returns a boolean array which is True if that gate is dependent on any of the gates in numbs
-    if visited is None:
-        visited = np.full(len(genome) // 2, False)
+    depth = 1
+    stackGates[0] = 0
+    stackInputs[0] = 0
+    state[0] = 1
+    while depth > 0:
+        gate = stackGates[depth - 1]
+        if stackInputs[depth - 1] == 2:
+            state[gate] = 2
+            order[orderLength] = gate
+            orderLength += 1
+            depth -= 1
+            continue
+        k = genome[gate * 2 + stackInputs[depth - 1]]
+        stackInputs[depth - 1] += 1
+        if k < 0 or state[k] == 2:
+            continue
+        if state[k] == 1:
+            cyclic = True
+            continue
+        state[k] = 1
+        stackGates[depth] = k
+        stackInputs[depth] = 0
+        depth += 1
 
-    directDependents = [i // 2 for i, k in enumerate(genome) if k in numbs and not i // 2 in visited]
-    visited[directDependents] = True
+    return order[:orderLength], cyclic
 
-    if len(directDependents) == 0:
-        return visited
-    else:
-        return getDependents(genome, directDependents, visited)
 
+@jit(nopython=True, cache=True)
+def evaluateColumns(genome, packedInputs, order):
+    # compute the output column of every gate in order with one NAND per word. Row r of the truth table is held by bit
+    # r % 64 of word r // 64, the inputs of every gate must come before it in order
+    size = len(genome) // 2
+    wordCount = packedInputs.shape[1]
+    columns = np.zeros((size, wordCount), dtype=np.uint64)
+    for gate in order:
+        k1 = genome[gate * 2]
+        k2 = genome[gate * 2 + 1]
+        for w in range(wordCount):
+            if k1 < 0:
+                input1 = packedInputs[-1 - k1, w]
+            else:
+                input1 = columns[k1, w]
+            if k2 < 0:
+                input2 = packedInputs[-1 - k2, w]
+            else:
+                input2 = columns[k2, w]
+            columns[gate, w] = ~(input1 & input2)
+    return columns
 
-@jit(nopython=True)
-def getPrecursors(genome, numbs=None, visited=None):
-    # returns a boolean array which is True if that item is a precursor of any of the gates in numbs
-    if visited is None:
-        visited = np.full(len(genome) // 2, False)
-    if numbs is None:
-        numbs = np.array([0])
 
-    directPrecursors = np.full(len(genome)//2, False)
-    for i in numbs:
-        if visited[i]:
+@jit(nopython=True, cache=True)
+def evaluateOutput(genome, packedInputs, order, columns):
+    # the packed output column of gate 0, computed as evaluateColumns does but a chunk of words at a time. columns is
+    # the buffer holding the chunk of every gate, its shape (gates, words per chunk) bounds the memory used
+    wordCount = packedInputs.shape[1]
+    chunk = columns.shape[1]
+    output = np.empty(wordCount, dtype=np.uint64)
+    for start in range(0, wordCount, chunk):
+        stop = min(start + chunk, wordCount)
+        for gate in order:
+            k1 = genome[gate * 2]
+            k2 = genome[gate * 2 + 1]
+            for w in range(start, stop):
+                if k1 < 0:
+                    input1 = packedInputs[-1 - k1, w]
+                else:
+                    input1 = columns[k1, w - start]
+                if k2 < 0:
+                    input2 = packedInputs[-1 - k2, w]
+                else:
+                    input2 = columns[k2, w - start]
+                columns[gate, w - start] = ~(input1 & input2)
+        output[start:stop] = columns[0, :stop - start]
+    return output
+
+
+@jit(nopython=True, cache=True)
+def truthTableBitParallel(genome, possibleInputs, packedInputs):
+    # same output as truthTable. If gate 0 is connected to a cycle the outcome depends on the order in which resolve
+    # visits the gates, so the recursive evaluation is used for those genomes. It is also used below 64 rows, a single
+    # word, as the bit parallel evaluation of one genome only catches up at about 32 rows
+    if len(possibleInputs) < 64:
+        return truthTable(genome, possibleInputs)
+    order, cyclic = gateOrder(genome)
+    if cyclic:
+        return truthTable(genome, possibleInputs)
+
+    columns = evaluateColumns(genome, packedInputs, order)
+    results = np.empty(len(possibleInputs))
+    for i in range(len(possibleInputs)):
+        results[i] = (columns[0, i // 64] >> np.uint64(i % 64)) & np.uint64(1)
+    return results
+
+
+def packInputs(possibleInputs):
+    # pack every column of possibleInputs into 64 bit words, row r is held by bit r % 64 of word r // 64
+    rowCount, inputCount = possibleInputs.shape
+    wordCount = (rowCount + 63) // 64
+    bits = np.zeros((inputCount, wordCount * 64), dtype=np.uint8)
+    bits[:, :rowCount] = np.asarray(possibleInputs).T != 0
+    packed = np.packbits(bits.reshape(inputCount, wordCount, 64), axis=-1, bitorder="little")
+    return np.ascontiguousarray(packed).view("<u8").reshape(inputCount, wordCount).astype(np.uint64)
+
+
+@jit(nopython=True, cache=True)
+def reachable(genome, inputCount, seeds, forward, includeSeeds):
+    # iterative reachability over bitmask adjacency, where node k + inputCount stands for gate or input k and inputs
+    # below -inputCount are left out. seeds is a boolean array over the nodes. Returns a boolean array of the nodes
+    # reached from the seeds by following the inputs of every gate backwards, or its output forwards. The seeds are
+    # included if includeSeeds is True, otherwise only those reached from another seed
+    nodeCount = len(genome) // 2 + inputCount
+    wordCount = (nodeCount + 63) // 64
+    adjacency = np.zeros((nodeCount, wordCount), dtype=np.uint64)
+    for i in range(len(genome)):
+        k = genome[i] + inputCount
+        if k < 0:
             continue
-        k1 = genome[i*2]
-        k2 = genome[i*2+1]
-        if k1 >= 0 and not visited[abs(k1)]:
-            directPrecursors[k1] = True
-        if k2 >= 0 and not visited[abs(k2)]:
-            directPrecursors[k2] = True
+        gate = i // 2 + inputCount
+        if forward:
+            adjacency[k, gate // 64] |= np.uint64(1) << np.uint64(gate % 64)
+        else:
+            adjacency[gate, k // 64] |= np.uint64(1) << np.uint64(k % 64)
 
-    for i in numbs:
-        visited[i] = True
+    reached = np.zeros(wordCount, dtype=np.uint64)
+    frontier = np.zeros(wordCount, dtype=np.uint64)
+    for node in range(nodeCount):
+        if seeds[node]:
+            frontier[node // 64] |= np.uint64(1) << np.uint64(node % 64)
+    if includeSeeds:
+        reached[:] = frontier
 
-    directPrecursors = np.where(directPrecursors)[0]
+    following = np.zeros(wordCount, dtype=np.uint64)
+    active = True
+    while active:
+        following[:] = 0
+        for w in range(wordCount):
+            word = frontier[w]
+            if word == 0:
+                continue
+            for b in range(64):
+                if (word >> np.uint64(b)) & np.uint64(1):
+                    for v in range(wordCount):
+                        following[v] |= adjacency[w * 64 + b, v]
+        active = False
+        for w in range(wordCount):
+            frontier[w] = following[w] & ~reached[w]
+            if frontier[w] != 0:
+                active = True
+            reached[w] |= frontier[w]
 
-    if len(directPrecursors) == 0:
-        return visited
-    else:
-        return getPrecursors(genome, directPrecursors, visited)
+    cone = np.zeros(nodeCount, dtype=np.bool_)
+    for node in range(nodeCount):
+        cone[node] = (reached[node // 64] >> np.uint64(node % 64)) & np.uint64(1)
+    return cone
+
+
+@jit(nopython=True, cache=True)
+def populationReachable(population, inputCount, seeds, forward, includeSeeds):
+    # reachable for every genome of a 2D population, seeds[n] holding the seeds of genome n
+    cones = np.zeros(seeds.shape, dtype=np.bool_)
+    for n in range(len(population)):
+        cones[n] = reachable(population[n], inputCount, seeds[n], forward, includeSeeds)
+    return cones
+
+
+@jit(nopython=True, cache=True)
+def populationPrecursors(population, inputCount=0):
+    # getPrecursors of every genome at once, or getPrecursorsWithInputs for inputCount inputs
+    seeds = np.zeros((len(population), population.shape[1] // 2 + inputCount), dtype=np.bool_)
+    seeds[:, inputCount] = True
+    return populationReachable(population, inputCount, seeds, False, True)
 
-@jit(nopython=True)
-def getPrecursorsWithInputs(genome, numbs=None, visited=None):
+
+@jit(nopython=True, cache=True)
+def getDependents(genome, numbs):
+    # returns a boolean array which is True if that gate is dependent on any of the gates or inputs in numbs, an array
+    size = len(genome) // 2
+    if len(numbs) == 0:
+        return np.zeros(size, dtype=np.bool_)
+    offset = max(0, -min(np.int64(genome.min()), np.int64(numbs.min())))
+    seeds = np.zeros(size + offset, dtype=np.bool_)
+    for numb in numbs:
+        seeds[numb + offset] = True
+    return reachable(genome, offset, seeds, True, False)[offset:]
+
+
+@jit(nopython=True, cache=True)
+def getPrecursors(genome, numbs=None):
     # returns a boolean array which is True if that item is a precursor of any of the gates in numbs
-    if visited is None:
-        visited = np.full(len(genome) // 2 + inputCount, False)
     if numbs is None:
         numbs = np.array([0])
+    seeds = np.zeros(len(genome) // 2, dtype=np.bool_)
+    seeds[numbs] = True
+    return reachable(genome, 0, seeds, False, True)
 
-    directPrecursors = np.full(len(genome)//2 + inputCount, False)
-    for i in numbs:
-        if visited[i+inputCount] or i<0:
-            continue
-        k1 = genome[i*2]+inputCount
-        k2 = genome[i*2+1]+inputCount
-        if not visited[k1]:
-            directPrecursors[k1] = True
-        if not visited[k2]:
-            directPrecursors[k2] = True
 
-    for i in numbs:
-        visited[i+inputCount] = True
-
-    directPrecursors = np.where(directPrecursors)[0]-inputCount
+@jit(nopython=True, cache=True)
+def getPrecursorsWithInputs(genome, numbs=None, inputCount=defaultInputCount):
+    # returns a boolean array which is True if that item is a precursor of any of the gates in numbs
+    if numbs is None:
+        numbs = np.array([0])
+    seeds = np.zeros(len(genome) // 2 + inputCount, dtype=np.bool_)
+    seeds[numbs + inputCount] = True
+    return reachable(genome, inputCount, seeds, False, True)
 
 
-    if len(directPrecursors) == 0:
-        return visited
-    else:
-        return getPrecursorsWithInputs(genome, directPrecursors, visited)
+def geneDtype(size, inputCount):
+    # smallest signed integer type holding every input and gate index, in which populations and winners are stored
+    for dtype in [np.int8, np.int16, np.int32]:
+        if np.iinfo(dtype).min <= -inputCount and size - 1 <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
 
 
 def randomNetwork(size, inputCount):
@@ -118,8 +325,48 @@ def randomNetwork(size, inputCount):
     return genome
 
 
-def getGraph(genome):
-    precursors = getPrecursorsWithInputs(genome)
+def randomPopulation(popSize, size, inputCount, rng=None, activeGates=None, batchLimit=10000, maxDraws=int(1E8)):
+    # popSize random networks drawn at once, every connection uniform over the inputs and gates as in randomNetwork.
+    # rng is a numpy Generator, the global numpy generator is used if it is None. With activeGates, networks are drawn
+    # until there are popSize with that many gates connected to gate 0, gate 0 included, in batches of at most
+    # max(popSize, batchLimit) networks. A RuntimeError is raised if maxDraws networks are drawn before that, as some
+    # targets are too rare to ever be filled. Genes are of type geneDtype
+    def draw(count):
+        if rng is None:
+            batch = np.random.randint(-inputCount, size, (count, size * 2))
+        else:
+            batch = rng.integers(-inputCount, size, (count, size * 2))
+        return batch.astype(geneDtype(size, inputCount))
+
+    if activeGates is None:
+        return draw(popSize)
+    if not 1 <= activeGates <= size:
+        raise ValueError("activeGates must be between 1 and size, got " + str(activeGates))
+
+    batches = []
+    accepted = 0
+    drawn = 0
+    while accepted < popSize:
+        # draw enough to fill the population at the acceptance rate seen so far
+        count = popSize if drawn == 0 else int((popSize - accepted) * drawn / max(accepted, 1)) + 1
+        count = min(count, max(popSize, batchLimit), maxDraws - drawn)
+        if count <= 0:
+            raise RuntimeError("Found " + str(accepted) + " of " + str(popSize) + " networks with " +
+                               str(activeGates) + " active gates in " + str(drawn) + " draws")
+        batch = draw(count)
+        drawn += count
+        batch = batch[populationPrecursors(batch).sum(axis=1) == activeGates]
+        batches.append(batch)
+        accepted += len(batch)
+    return np.concatenate(batches)[:popSize]
+
+
+def getGraph(genome, inputCount=None):
+    # networkx is only imported when it is used, as the experiments measure modularity with the compiled engines
+    import networkx as nx
+    if inputCount is None:
+        inputCount = max(defaultInputCount, -int(np.min(genome)))
+    precursors = getPrecursorsWithInputs(genome, None, inputCount)
     # add 0 node even if its not its own precursor
     precursors[0] = True
     graph = nx.Graph()
@@ -130,13 +377,199 @@ def getGraph(genome):
     return graph
 
 
-def getModularity(genome):
-    G = getGraph(genome)
-    if G.number_of_edges() == 0:
-        return 0
+@jit(nopython=True, nogil=True, cache=True)
+def getAdjacency(genome):
+    # adjacency matrix of the graph built by getGraph, restricted to the gates connected to gate 0 and the inputs they
+    # read. Nodes keep the order of their labels, inputs first. Repeated connections count once and a self loop is
+    # stored as 2 so that every row sums to the degree of its node
+    offset = max(0, -np.min(genome))
+    order, _ = gateOrder(genome)
+    used = np.zeros(len(genome) // 2 + offset, dtype=np.bool_)
+    for gate in order:
+        used[gate + offset] = True
+        used[genome[gate * 2] + offset] = True
+        used[genome[gate * 2 + 1] + offset] = True
+    labels = np.cumsum(used) - 1
+
+    nodeCount = labels[-1] + 1
+    adjacency = np.zeros((nodeCount, nodeCount), dtype=np.int64)
+    for gate in order:
+        for k in genome[gate * 2:gate * 2 + 2]:
+            u = labels[gate + offset]
+            v = labels[k + offset]
+            if u == v:
+                adjacency[u, u] = 2
+            else:
+                adjacency[u, v] = 1
+                adjacency[v, u] = 1
+    return adjacency
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def partitionModularity(adjacency, membership):
+    # modularity of the partition that places node i in community membership[i]
+    total = adjacency.sum()
+    if total == 0:
+        return 0.0
+    nodeCount = len(adjacency)
+    within = np.zeros(nodeCount)
+    degrees = np.zeros(nodeCount)
+    for i in range(nodeCount):
+        for j in range(nodeCount):
+            degrees[membership[i]] += adjacency[i, j]
+            if membership[i] == membership[j]:
+                within[membership[i]] += adjacency[i, j]
+
+    modularity = 0.0
+    for c in range(nodeCount):
+        modularity += within[c] / total - (degrees[c] / total) ** 2
+    return modularity
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def modularityCNM(adjacency):
+    # Clauset-Newman-Moore greedy merging as done by networkx greedy_modularity_communities. The pair of communities
+    # with the largest change in modularity is merged, ties going to the lowest pair of node labels, and the first
+    # community of the pair is merged into the second. Merging stops once the best change is negative
+    nodeCount = len(adjacency)
+    edgeCount = adjacency.sum() // 2
+    if edgeCount == 0:
+        return 0.0
+    q0 = 1 / edgeCount
+    a = np.empty(nodeCount)
+    for u in range(nodeCount):
+        a[u] = adjacency[u].sum() * q0 * 0.5
+
+    dq = np.zeros((nodeCount, nodeCount))
+    linked = np.zeros((nodeCount, nodeCount), dtype=np.bool_)
+    for u in range(nodeCount):
+        for v in range(nodeCount):
+            if u != v and adjacency[u, v] > 0:
+                linked[u, v] = True
+                dq[u, v] = q0 - (a[u] * a[v] + a[u] * a[v])
+
+    membership = np.arange(nodeCount)
+    while True:
+        bestU = -1
+        bestV = -1
+        for u in range(nodeCount):
+            for v in range(nodeCount):
+                if linked[u, v] and (bestU < 0 or dq[u, v] > dq[bestU, bestV]):
+                    bestU = u
+                    bestV = v
+        if bestU < 0 or dq[bestU, bestV] < 0:
+            break
+
+        u = bestU
+        v = bestV
+        for w in range(nodeCount):
+            if w == u or w == v or not (linked[u, w] or linked[v, w]):
+                continue
+            if linked[u, w] and linked[v, w]:
+                dqvw = dq[v, w] + dq[u, w]
+            elif linked[v, w]:
+                dqvw = dq[v, w] - (a[u] * a[w] + a[w] * a[u])
+            else:
+                dqvw = dq[u, w] - (a[v] * a[w] + a[w] * a[v])
+            dq[v, w] = dqvw
+            dq[w, v] = dqvw
+            linked[v, w] = True
+            linked[w, v] = True
+        linked[u, :] = False
+        linked[:, u] = False
+        for i in range(nodeCount):
+            if membership[i] == u:
+                membership[i] = v
+        a[v] += a[u]
+        a[u] = 0
+
+    return partitionModularity(adjacency, membership)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def modularityLouvain(adjacency):
+    # Louvain method. Nodes are moved one at a time to the neighbouring community that most increases modularity until
+    # no move helps, then every community is collapsed into a single node and the process repeated
+    weights = adjacency.astype(np.float64)
+    total = weights.sum()
+    if total == 0:
+        return 0.0
+    membership = np.arange(len(adjacency))
+
+    while True:
+        count = len(weights)
+        community = np.arange(count)
+        degrees = weights.sum(axis=1)
+        totals = degrees.copy()
+        links = np.zeros(count)
+        improved = False
+        moved = True
+        while moved:
+            moved = False
+            for i in range(count):
+                links[:] = 0
+                for j in range(count):
+                    if j != i:
+                        links[community[j]] += weights[i, j]
+                current = community[i]
+                totals[current] -= degrees[i]
+                best = current
+                bestGain = links[current] - totals[current] * degrees[i] / total
+                for c in range(count):
+                    if links[c] > 0:
+                        gain = links[c] - totals[c] * degrees[i] / total
+                        if gain > bestGain + 1e-12:
+                            best = c
+                            bestGain = gain
+                totals[best] += degrees[i]
+                if best != current:
+                    community[i] = best
+                    moved = True
+                    improved = True
+        if not improved:
+            break
+
+        # collapse every community into one node
+        labels = np.full(count, -1)
+        newCount = 0
+        for i in range(count):
+            if labels[community[i]] < 0:
+                labels[community[i]] = newCount
+                newCount += 1
+        newWeights = np.zeros((newCount, newCount))
+        for i in range(count):
+            for j in range(count):
+                newWeights[labels[community[i]], labels[community[j]]] += weights[i, j]
+        for i in range(len(membership)):
+            membership[i] = labels[community[membership[i]]]
+        weights = newWeights
+
+    return partitionModularity(adjacency, membership)
+
+
+# modularity is found either by networkx or by the compiled engines working on adjacency matrices. "cnm" reproduces the
+# networkx greedy result and "louvain" uses the Louvain method instead
+modularityEngine = "cnm"
+
+
+def getModularity(genome, engine=None):
+    if engine is None:
+        engine = modularityEngine
+
+    if engine == "networkx":
+        from networkx.algorithms import community
+        G = getGraph(genome)
+        if G.number_of_edges() == 0:
+            return 0
+        else:
+            partition = community.greedy_modularity_communities(G)
+            modularity = community.modularity(G, partition)
+    elif engine == "cnm":
+        modularity = modularityCNM(getAdjacency(genome))
+    elif engine == "louvain":
+        modularity = modularityLouvain(getAdjacency(genome))
     else:
-        partition = community.greedy_modularity_communities(G)
-        modularity = community.modularity(G, partition)
+        raise ValueError("Unknown modularity engine: " + str(engine))
 
     return modularity
 
@@ -146,3 +579,241 @@ def adjustedModularity(genome, Qmax, Qrand):
     Qreal = (Q-Qrand)/(Qmax-Qrand)
     return Qreal
 
+
+# the values of Qmax and Qrand used to adjust modularity are kept in a parameter file, written by RandomModularity.py
+modularityParamsPath = "Data/AdjustedModularityParams/Params.json"
+
+
+def loadModularityParams(Qmax, Qrand, path=modularityParamsPath):
+    # returns Qmax and Qrand as stored in the parameter file, the values passed are used for those missing
+    if os.path.exists(path):
+        with open(path) as inputFile:
+            params = json.load(inputFile)
+        Qmax = params.get("Qmax", Qmax)
+        Qrand = params.get("Qrand", Qrand)
+    return Qmax, Qrand
+
+
+def saveModularityParams(path=modularityParamsPath, **params):
+    # add params to the parameter file, keeping the entries it already holds
+    stored = {}
+    if os.path.exists(path):
+        with open(path) as inputFile:
+            stored = json.load(inputFile)
+    stored.update(params)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporaryPath = path + "." + str(os.getpid()) + ".tmp"
+    with open(temporaryPath, "w") as outputFile:
+        json.dump(stored, outputFile, indent=4)
+    os.replace(temporaryPath, path)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def compactGenome(genome):
+    # keep only the gates connected to gate 0, renumbered in the order of their labels. The nodes and their order are
+    # those getAdjacency builds for the genome, so the compact genome has the same modularity under every engine.
+    # Genomes that differ only in unconnected gates share the same compact genome
+    size = len(genome) // 2
+    order, _ = gateOrder(genome)
+    active = np.zeros(size, dtype=np.bool_)
+    for gate in order:
+        active[gate] = True
+    labels = np.cumsum(active) - 1
+
+    compact = np.empty(len(order) * 2, dtype=np.int64)
+    n = 0
+    for gate in range(size):
+        if active[gate]:
+            for i in range(2):
+                k = genome[gate * 2 + i]
+                compact[n * 2 + i] = k if k < 0 else labels[k]
+            n += 1
+    return compact
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def canonicalGenome(genome):
+    # relabel the gates connected to gate 0 in the order a breadth first search from gate 0 reaches them, reading the
+    # inputs of every gate in order, and drop the rest. Genomes that differ only in unconnected gates or in the
+    # numbering of their gates share the same canonical genome. Greedy CNM breaks ties by node label, so the modularity
+    # of the canonical genome can differ from that of the genome
+    size = len(genome) // 2
+    labels = np.full(size, -1)
+    order = np.empty(size, dtype=np.int64)
+    labels[0] = 0
+    order[0] = 0
+    count = 1
+    for n in range(size):
+        if n == count:
+            break
+        for k in genome[order[n] * 2:order[n] * 2 + 2]:
+            if k >= 0 and labels[k] < 0:
+                labels[k] = count
+                order[count] = k
+                count += 1
+
+    canonical = np.empty(count * 2, dtype=np.int64)
+    for n in range(count):
+        for i in range(2):
+            k = genome[order[n] * 2 + i]
+            canonical[n * 2 + i] = k if k < 0 else labels[k]
+    return canonical
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def reducedGenome(genome, relabel):
+    # the canonical genome if relabel is True and the compact genome otherwise
+    if relabel:
+        return canonicalGenome(genome)
+    return compactGenome(genome)
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def reducedPopulation(population, relabel):
+    # reducedGenome of every row of population, each written at the start of a row of reduced, of which lengths gives
+    # the number of genes
+    reduced = np.zeros(population.shape, dtype=np.int64)
+    lengths = np.empty(len(population), dtype=np.int64)
+    for n in range(len(population)):
+        genome = reducedGenome(population[n], relabel)
+        reduced[n, :len(genome)] = genome
+        lengths[n] = len(genome)
+    return reduced, lengths
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def reducedModularities(reduced, lengths, louvain):
+    # the modularity of every genome given as by reducedPopulation, found by modularityLouvain if louvain is True and
+    # by modularityCNM otherwise
+    modularities = np.empty(len(reduced))
+    for n in range(len(reduced)):
+        adjacency = getAdjacency(reduced[n, :lengths[n]])
+        if louvain:
+            modularities[n] = modularityLouvain(adjacency)
+        else:
+            modularities[n] = modularityCNM(adjacency)
+    return modularities
+
+
+def measureReduced(reduced, lengths, engine):
+    # getModularity of every genome given as by reducedPopulation, in one call for the compiled engines
+    if engine == "cnm" or engine == "louvain":
+        return reducedModularities(reduced, lengths, engine == "louvain")
+    return np.array([float(getModularity(reduced[n, :lengths[n]], engine)) for n in range(len(reduced))])
+
+
+def uniqueRows(population):
+    # the distinct rows of population, a 2D array, and the index in them of every row. Rows are compared as raw bytes,
+    # which is much faster than np.unique along an axis
+    population = np.ascontiguousarray(population)
+    rows = population.view(np.dtype((np.void, population.dtype.itemsize * population.shape[1]))).reshape(-1)
+    _, indexes, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    return population[indexes], inverse.reshape(-1)
+
+
+def populationModularity(population, engine=None, Qmax=None, Qrand=None):
+    # getModularity of every genome of population, a 2D array. Repeated genomes are measured once and the adjacency
+    # matrices of the others are built and measured in one compiled call. With Qmax and Qrand the adjusted modularity is
+    # returned
+    if engine is None:
+        engine = modularityEngine
+    population = np.asarray(population)
+    if len(population) == 0:
+        return np.empty(0)
+
+    unique, inverse = uniqueRows(population)
+    modularities = measureReduced(*reducedPopulation(unique, False), engine)[inverse]
+    if Qmax is not None and Qrand is not None:
+        return (modularities - Qrand) / (Qmax - Qrand)
+    return modularities
+
+
+def readModularityEntries(path):
+    # the entries of a file written by ModularityCache.save, in the order they were written
+    entries = {}
+    if os.path.exists(path):
+        with open(path) as inputFile:
+            for line in inputFile:
+                if line.strip():
+                    key, value = line.strip().split(",")
+                    entries[key] = float(value)
+    return entries
+
+
+class ModularityCache(object):
+    # memoizes getModularity in a bounded LRU keyed on the engine and the compact genome, so the value returned is
+    # always the modularity of the genome passed while networks that differ only in unconnected gates share an entry.
+    # With relabel the key is the canonical genome instead, which also shares the entry between numberings of the same
+    # network, the value then being the modularity of the canonical numbering. Every entry holds the modularity of the
+    # genome its key is made from, so both kinds of cache can share a file
+    def __init__(self, maxSize=int(1E6), engine=None, relabel=False):
+        self.cache = Caching.LRUCache(maxSize)
+        self.engine = engine
+        self.relabel = relabel
+
+    def getModularity(self, genome):
+        engine = modularityEngine if self.engine is None else self.engine
+        reduced = reducedGenome(np.asarray(genome, dtype=np.int64), self.relabel)
+        key = engine + ":" + hashlib.blake2b(reduced.tobytes(), digest_size=16).hexdigest()
+        modularity = self.cache.get(key)
+        if modularity is None:
+            modularity = float(getModularity(reduced, engine))
+            self.cache.put(key, modularity)
+        return modularity
+
+    def populationModularity(self, population, Qmax=None, Qrand=None):
+        # getModularity of every genome of population, a 2D array. Repeated genomes are looked up once and the
+        # modularity of every genome missing from the cache is found in one call. With Qmax and Qrand the adjusted
+        # modularity is returned
+        engine = modularityEngine if self.engine is None else self.engine
+        population = np.asarray(population)
+        if len(population) == 0:
+            return np.empty(0)
+
+        unique, inverse = uniqueRows(population)
+        reduced, lengths = reducedPopulation(unique, self.relabel)
+        keys = [engine + ":" + hashlib.blake2b(reduced[n, :lengths[n]].tobytes(), digest_size=16).hexdigest()
+                for n in range(len(unique))]
+        modularities = np.array([self.cache.get(key) for key in keys], dtype=np.float64)
+        missing = np.nonzero(np.isnan(modularities))[0]
+        if len(missing) > 0:
+            modularities[missing] = measureReduced(reduced[missing], lengths[missing], engine)
+            for n in missing:
+                self.cache.put(keys[n], float(modularities[n]))
+
+        modularities = modularities[inverse]
+        if Qmax is not None and Qrand is not None:
+            return (modularities - Qrand) / (Qmax - Qrand)
+        return modularities
+
+    def adjustedModularity(self, genome, Qmax, Qrand):
+        Q = self.getModularity(genome)
+        Qreal = (Q-Qrand)/(Qmax-Qrand)
+        return Qreal
+
+    def save(self, path):
+        # one "key,modularity" line per entry. Parallel runs share the file, so the entries the others saved to it since
+        # it was loaded are merged in under a lock rather than overwritten, keeping the maxSize most recent. The file is
+        # replaced in one step so it is never left half written
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".lock", "w") as lockFile:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            entries = readModularityEntries(path)
+            with self.cache.lock:
+                for key, value in self.cache.items.items():
+                    entries.pop(key, None)
+                    entries[key] = value
+            lines = [key + "," + repr(value) for key, value in entries.items()][-self.cache.maxSize:]
+            temporaryPath = path + "." + str(os.getpid()) + ".tmp"
+            with open(temporaryPath, "w") as outputFile:
+                outputFile.write("\n".join(lines))
+            os.replace(temporaryPath, path)
+
+    def load(self, path):
+        for key, value in readModularityEntries(path).items():
+            self.cache.put(key, value)
+
+    def report(self):
+        return ("Modularity cache: " + str(self.cache.hits) + " hits, " + str(self.cache.misses) + " misses, " +
+                str(len(self.cache)) + " networks stored")
+
@@ -0,0 +1,68 @@
+import multiprocessing
+import random
+import time
+import numpy as np
+
+
+# the seed sequence of the run last seeded in this process, from which runGenerator seeds the generators of its parts
+runSeedSequence = None
+
+
+def seedRepetition(seed, *key):
+    # seed the generators used by the simulation. Run j, seeded with the key (j,), gets the same seed whichever process
+    # it lands on. Longer keys seed the parts of a run, such as its islands
+    global runSeedSequence
+    runSeedSequence = np.random.SeedSequence(seed, spawn_key=key)
+    state = runSeedSequence.generate_state(2)
+    random.seed(int(state[0]))
+    np.random.seed(int(state[1]))
+
+
+def runGenerator(*key):
+    # a generator of its own for a part of the run last seeded, such as the sampling of its reporter, seeded from the
+    # seed of the run and key. Nothing is drawn from the global generators, so the evolution is the same whether it is
+    # created or not. It is unseeded if no run was seeded in this process
+    if runSeedSequence is None:
+        return np.random.default_rng()
+    return np.random.default_rng(np.random.SeedSequence(runSeedSequence.generate_state(4), spawn_key=key))
+
+
+def runSeeded(arguments):
+    runFunc, seed, j = arguments
+    seedRepetition(seed, j)
+    t1 = time.perf_counter()
+    generations = runFunc(j)
+    return j, generations, time.perf_counter() - t1
+
+
+def runRepetitions(runFunc, repetitions, processes=None, seed=None):
+    # run runFunc(j) for every repetition j over a pool of processes and return the generations per second achieved.
+    # runFunc must be defined at module level and return the number of generations it ran, leaving out those of a run
+    # resumed from a checkpoint. processes=None uses every core and processes=1 runs everything in this process
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    print("Seed: " + str(seed))
+
+    arguments = [(runFunc, seed, j) for j in range(repetitions)]
+    totalGenerations = 0
+    t1 = time.perf_counter()
+    if processes == 1:
+        results = map(runSeeded, arguments)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(runSeeded, arguments)
+
+    try:
+        for j, generations, runTime in results:
+            totalGenerations += generations
+            print("Finished run " + str(j + 1) + " after " + str(generations) + " generations in " +
+                  str(runTime) + " s")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    throughput = totalGenerations / (time.perf_counter() - t1)
+    print("Throughput: " + str(throughput) + " generations per second over " + str(repetitions) + " runs")
+    return throughput
@@ -0,0 +1,51 @@
+import json
+import time
+
+
+class PhaseTimer(object):
+    # accumulates the wall time and number of calls of every phase. lap(phase) charges the time since the previous lap
+    # to phase, and write appends the totals since the last write to path as one JSON record. Started once, every
+    # moment of the run is charged to some phase
+    def __init__(self, path):
+        self.path = path
+        self.times = {}
+        self.calls = {}
+        self.last = time.perf_counter()
+
+    def start(self):
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.times[phase] = self.times.get(phase, 0.0) + now - self.last
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        self.last = now
+
+    def write(self, **fields):
+        record = dict(fields)
+        record["phases"] = dict((phase, {"time": self.times[phase], "calls": self.calls[phase]})
+                                for phase in self.times)
+        with open(self.path, "a") as outputFile:
+            outputFile.write(json.dumps(record) + "\n")
+        self.times.clear()
+        self.calls.clear()
+
+
+class NullTimer(object):
+    # stands in for PhaseTimer when timings are switched off
+    def start(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def write(self, **fields):
+        pass
+
+
+nullTimer = NullTimer()
+
+
+def getTimer(path):
+    # a PhaseTimer writing to path, or the timer that does nothing if path is None
+    return nullTimer if path is None else PhaseTimer(path)
@@ -1,20 +1,61 @@
+import multiprocessing
 import numpy as np
 import NetworkFunctions as NFunc
-from scipy.stats import sem
 
-# generate random networks
-randomNetworks = [NFunc.randomNetwork(13, 4) for i in range(100000)]
+# Qrand is the average modularity of random networks whose connectivity matches that of those evolved. i.e. have
+# activeGates gates connected to gate 0, out of length gates taking inputCount inputs
+length = 13
+inputCount = 4
+activeGates = 11
 
-# select those whose connectivity matches that of those evolved. i.e. have 11 gates connected to gate 0
-sanitizedNetworks = [individual for individual in randomNetworks if sum(NFunc.getPrecursors(individual))==11]
-quantity = len(sanitizedNetworks)
+# random networks are measured batchSize at a time until the standard error of the average falls below targetError,
+# with at least minNetworks and at most maxNetworks networks measured. Networks are drawn from seed, a random seed is
+# drawn and printed if it is None. Modularity is measured over a pool of processes, None uses every core
+batchSize = 2000
+targetError = 5E-4
+minNetworks = 1000
+maxNetworks = int(1E6)
+seed = None
+processes = None
 
-# record the modularity of these networks and take the average
-modularities = list(map(NFunc.getModularity, sanitizedNetworks))
-average = np.mean(modularities)
-stdDev = sem(modularities)
+# the estimate is added to the parameter file the experiment scripts read Qmax and Qrand from
+paramsPath = NFunc.modularityParamsPath
 
-# write measured modularity to file
-with open("Data\AdjustedModularityParams\Qrand.txt", "w") as outputFile:
-    outputFile.write("Average modularity over " + str(len(sanitizedNetworks)) + " random networks found to be: \n")
-    outputFile.write(str(average) + "±" + str(stdDev))
\ No newline at end of file
+
+def measureModularity(networks):
+    # the modularity of every network, as the modularity cache of the experiments measures it
+    return NFunc.populationModularity(networks).tolist()
+
+
+def estimateQrand(rng, pool):
+    modularities = []
+    standardError = np.inf
+    while len(modularities) < maxNetworks and (len(modularities) < minNetworks or standardError > targetError):
+        # only networks whose connectivity matches that of those evolved are drawn
+        networks = NFunc.randomPopulation(batchSize, length, inputCount, rng, activeGates)
+
+        chunks = np.array_split(networks, max(1, len(networks) // 500))
+        for chunkModularities in pool.imap(measureModularity, chunks):
+            modularities += chunkModularities
+        if len(modularities) > 1:
+            standardError = np.std(modularities, ddof=1) / np.sqrt(len(modularities))
+        print("Measured " + str(len(modularities)) + " random networks. Qrand: " +
+              str(np.mean(modularities)) + " ± " + str(standardError))
+    return np.mean(modularities), standardError, len(modularities)
+
+
+if __name__ == "__main__":
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    print("Seed: " + str(seed))
+
+    with multiprocessing.Pool(processes) as pool:
+        average, standardError, quantity = estimateQrand(np.random.default_rng(seed), pool)
+
+    NFunc.saveModularityParams(paramsPath, Qrand=average, QrandError=standardError, QrandNetworks=quantity,
+                               QrandSeed=seed)
+
+    # write measured modularity to file
+    with open("Data/AdjustedModularityParams/Qrand.txt", "w", encoding="utf-8") as outputFile:
+        outputFile.write("Average modularity over " + str(quantity) + " random networks found to be: \n")
+        outputFile.write(str(average) + "±" + str(standardError))
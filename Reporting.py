@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+class AsyncReporter(object):
+    # runs a reporter function, such as averageModularity, in background threads so that evolution does not wait for
+    # it. Only every samplingPeriod-th generation is reported on. The reporter is passed a snapshot of at most
+    # sampleSize individuals, drawn at random from those for which select(population, fitnesses) is True, and their
+    # fitnesses. sampleSize=None passes all of them and select=None considers the whole population. The sample is drawn
+    # from the generator random, such as ParallelRunner.runGenerator gives, so the random draws of the evolution are the
+    # same whatever the budget. Its state is saved with the checkpoints of the run so that a resumed run draws the same
+    # samples. random=None draws from an unseeded generator
+    def __init__(self, reporterFunc, samplingPeriod=1, sampleSize=None, select=None, threads=1, emptyReport=None,
+                 random=None):
+        self.reporterFunc = reporterFunc
+        self.samplingPeriod = samplingPeriod
+        self.sampleSize = sampleSize
+        self.select = select
+        self.emptyReport = emptyReport
+        self.random = np.random.default_rng() if random is None else random
+        self.executor = ThreadPoolExecutor(threads)
+        self.pending = {}
+
+    def submit(self, generation, population, fitnesses):
+        # queue the report of generation. Returns emptyReport so it can be used as the reporterFunc of runGeneration
+        if generation % self.samplingPeriod != 0:
+            return self.emptyReport
+
+        if self.select is None:
+            rows = np.arange(len(population))
+        else:
+            rows = np.nonzero(self.select(population, fitnesses))[0]
+        if self.sampleSize is not None and len(rows) > self.sampleSize:
+            rows = self.random.choice(rows, self.sampleSize, replace=False)
+        # indexing copies the individuals, so the snapshot is unaffected by later changes to population
+        self.pending[generation] = self.executor.submit(self.reporterFunc, np.asarray(population)[rows],
+                                                        np.asarray(fitnesses)[rows])
+        return self.emptyReport
+
+    def results(self, wait=False):
+        # returns (generation, report) for every report finished since the last call, in order of generation. With
+        # wait, every pending report is waited for
+        finished = sorted(generation for generation, future in self.pending.items() if wait or future.done())
+        return [(generation, self.pending.pop(generation).result()) for generation in finished]
+
+    def collect(self, histories, wait=False):
+        # write every finished report into the history arrays at its generation, item m of the report going to
+        # histories[m]
+        for generation, report in self.results(wait):
+            for history, value in zip(histories, report):
+                history[generation] = value
+
+    def close(self):
+        self.executor.shutdown()
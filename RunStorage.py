@@ -0,0 +1,135 @@
+import os
+import glob
+import json
+import numpy as np
+
+# the data of a run is stored either as text, with one file per quantity as the experiments originally did, or as a
+# single compressed binary file per run under directory/Runs. The binary file holds every quantity as its own column:
+# integer genomes in the smallest type that fits, float32 fitness and modularity, and a json metadata header, usually
+# the config and constants of the experiment
+
+
+def runFile(directory, runName):
+    return directory + "Runs/Run" + runName + ".npz"
+
+
+def genomeDtype(networks):
+    # smallest signed integer type that holds every gene
+    if len(networks) == 0:
+        return np.int8
+    for dtype in [np.int8, np.int16, np.int32]:
+        if np.iinfo(dtype).min <= np.min(networks) and np.max(networks) <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def writeRun(directory, runName, fitness, modularity, modularityStdDev, networks, metadata=None,
+             outputFormat="binary", fitnessName="Fitness"):
+    # fitnessName is only used by the text format, the Qmax runs were stored under Fitnesses. In the binary format a
+    # quantity given as None is left out of the file
+    if outputFormat == "binary":
+        columns = {"metadata": np.array(json.dumps(metadata if metadata is not None else {}))}
+        if fitness is not None:
+            columns["fitness"] = np.asarray(fitness, dtype=np.float32)
+        if modularity is not None:
+            columns["modularity"] = np.asarray(modularity, dtype=np.float32)
+            columns["modularityStdDev"] = np.asarray(modularityStdDev, dtype=np.float32)
+        if networks is not None:
+            networks = np.asarray(networks)
+            columns["networks"] = networks.astype(genomeDtype(networks))
+        os.makedirs(directory + "Runs", exist_ok=True)
+        np.savez_compressed(runFile(directory, runName), **columns)
+    elif outputFormat == "text":
+        with open(directory + "Networks/Networks" + runName + ".txt", "w") as outputFile:
+            networkStrings = [",".join([str(k) for k in network]) for network in networks]
+            outputString = "\n".join(networkStrings)
+            outputFile.write(outputString)
+
+        with open(directory + fitnessName + "/" + fitnessName + runName + ".txt", "w") as outputFile:
+            outputString = "\n".join([str(k) for k in fitness])
+            outputFile.write(outputString)
+
+        with open(directory + "Modularity/Modularity" + runName + ".txt", "w") as outputFile:
+            dataStrings = [str(value) + ", " + str(stdDev) for value, stdDev in zip(modularity, modularityStdDev)]
+            outputString = "\n".join(dataStrings)
+            outputFile.write(outputString)
+    else:
+        raise ValueError("Unknown output format: " + str(outputFormat))
+
+
+def readText(path, columns):
+    # every line of a text output holds columns comma separated floats
+    values = np.loadtxt(path, delimiter=",", ndmin=2)
+    return values.reshape(-1, columns) if values.size > 0 else np.empty((0, columns))
+
+
+def textFitnessPath(directory, runName):
+    for fitnessName in ["Fitness", "Fitnesses"]:
+        path = directory + fitnessName + "/" + fitnessName + runName + ".txt"
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError("No fitness file for run " + runName + " in " + directory)
+
+
+def readQuantity(directory, runName, quantity):
+    # read one quantity from the binary file of a run
+    path = runFile(directory, runName)
+    with np.load(path) as data:
+        if quantity not in data.files:
+            raise FileNotFoundError("No " + quantity + " stored in " + path)
+        return data[quantity]
+
+
+def readFitness(directory, runName):
+    if os.path.exists(runFile(directory, runName)):
+        return readQuantity(directory, runName, "fitness").astype(np.float64)
+    return readText(textFitnessPath(directory, runName), 1)[:, 0]
+
+
+def readModularity(directory, runName):
+    # returns a (generations, 2) array of the mean modularity and its standard deviation
+    if os.path.exists(runFile(directory, runName)):
+        return np.column_stack([readQuantity(directory, runName, "modularity"),
+                                readQuantity(directory, runName, "modularityStdDev")]).astype(np.float64)
+    return readText(directory + "Modularity/Modularity" + runName + ".txt", 2)
+
+
+def readNetworks(directory, runName):
+    if os.path.exists(runFile(directory, runName)):
+        return readQuantity(directory, runName, "networks").astype(np.int64)
+    with open(directory + "Networks/Networks" + runName + ".txt") as inputFile:
+        networks = [[int(float(k)) for k in line.split(",")] for line in inputFile if line.strip()]
+    return np.array(networks, dtype=np.int64)
+
+
+def readMetadata(directory, runName):
+    if os.path.exists(runFile(directory, runName)):
+        return json.loads(str(readQuantity(directory, runName, "metadata")))
+    return {}
+
+
+def convertArchive(root="Data"):
+    # write a binary run file next to every run stored as text under root. The text files are left in place
+    converted = 0
+    for fitnessDirectory in sorted(glob.glob(root + "/**/Fitness", recursive=True) +
+                                   glob.glob(root + "/**/Fitnesses", recursive=True)):
+        directory = os.path.dirname(fitnessDirectory) + "/"
+        fitnessName = os.path.basename(fitnessDirectory)
+        for path in sorted(glob.glob(fitnessDirectory + "/" + fitnessName + "*.txt")):
+            runName = os.path.basename(path)[len(fitnessName):-len(".txt")]
+            # some runs of the archive are missing their modularity or networks file
+            modularity = [None, None]
+            networks = None
+            if os.path.exists(directory + "Modularity/Modularity" + runName + ".txt"):
+                modularity = readModularity(directory, runName).T
+            if os.path.exists(directory + "Networks/Networks" + runName + ".txt"):
+                networks = readNetworks(directory, runName)
+            writeRun(directory, runName, readFitness(directory, runName), modularity[0], modularity[1], networks,
+                     {"converted from": directory, "run": runName})
+            converted += 1
+    print("Converted " + str(converted) + " runs under " + root)
+    return converted
+
+
+if __name__ == "__main__":
+    convertArchive("Data")
@@ -0,0 +1,148 @@
+import argparse
+import importlib
+import itertools
+import json
+import multiprocessing
+import os
+import numpy as np
+import ParallelRunner as Runner
+
+# a sweep runs an experiment script once for every combination of the parameters in grid. Parameters are either keys
+# of the config of the script, like "elite fraction" or "mutation weights", or its module level constants, like popSize,
+# epochLength, sizeParam or cutoff. Every combination is repeated repetitions times, run j being seeded from seed and j
+# as in a normal launch. A random seed is drawn if seed is None
+experiment = "ModularGoals"
+grid = dict([("popSize", [500, 1000]), ("elite fraction", [0.2, 0.3]), ("epochLength", [20, 50]),
+             ("sizeParam", [0.1]), ("cutoff", [11]), ("mutation weights", [[0.3, 0.05, 0.05, 0.25, 0.35]])])
+repetitions = 10
+seed = None
+
+# the queue is a directory on storage shared by every worker, holding one JSON file per job. A job moves from Pending to
+# Claimed when a worker takes it and to Done once its run is written. The rename is atomic, so a job is claimed by a
+# single worker however many are polling the queue
+queuePath = "Data/Sweeps/"
+states = ["Pending", "Claimed", "Done"]
+
+
+def expandGrid(grid):
+    # every combination of the values in grid, as a list of dictionaries
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+def parameterKey(parameters):
+    # a name for a combination of parameters that can be used as a directory, e.g. "cutoff=11_elitefraction=0.3"
+    def formatValue(value):
+        if isinstance(value, (list, tuple)):
+            return ",".join(str(x) for x in value)
+        return str(value)
+    return "_".join(name.replace(" ", "") + "=" + formatValue(parameters[name]) for name in sorted(parameters))
+
+
+def jobName(experiment, parameters, j):
+    return experiment + "_" + parameterKey(parameters) + "_run" + str(j) + ".json"
+
+
+def applyParameters(module, parameters):
+    # set the parameters of a sweep on an experiment script, config keys first and module level constants otherwise
+    for name, value in parameters.items():
+        if name in module.config:
+            module.config[name] = value
+        elif hasattr(module, name):
+            setattr(module, name, value)
+        else:
+            raise KeyError(module.__name__ + " has no parameter " + name)
+
+
+def queueSweep(experiment, grid, repetitions, seed=None, path=queuePath):
+    # add a job to the queue for every run of the sweep, skipping the jobs already pending, claimed or done. Returns the
+    # number of jobs added
+    for state in states:
+        os.makedirs(path + state, exist_ok=True)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    queued = 0
+    for parameters in expandGrid(grid):
+        for j in range(repetitions):
+            name = jobName(experiment, parameters, j)
+            if any(os.path.exists(path + state + "/" + name) for state in states):
+                continue
+            job = dict(experiment=experiment, parameters=parameters, run=j, seed=seed)
+            temporaryPath = path + name + "." + str(os.getpid()) + ".tmp"
+            with open(temporaryPath, "w") as jobFile:
+                json.dump(job, jobFile)
+            os.replace(temporaryPath, path + "Pending/" + name)
+            queued += 1
+    return queued
+
+
+def claimJob(path=queuePath):
+    # move the first pending job to Claimed and return its name, or None once the queue is empty
+    for name in sorted(os.listdir(path + "Pending")):
+        try:
+            os.rename(path + "Pending/" + name, path + "Claimed/" + name)
+        except FileNotFoundError:
+            # another worker claimed it first
+            continue
+        return name
+    return None
+
+
+def runJob(name, path=queuePath):
+    # run a claimed job and mark it done. The script is reloaded so that no parameters or cached fitness values are
+    # carried over from the previous job, and its output is written under a directory named after the parameters
+    with open(path + "Claimed/" + name) as jobFile:
+        job = json.load(jobFile)
+    module = importlib.reload(importlib.import_module(job["experiment"]))
+    applyParameters(module, job["parameters"])
+    module.outputPath = module.outputPath + "Sweeps/" + parameterKey(job["parameters"]) + "/"
+    module.seed = job["seed"]
+
+    j, generations, runTime = Runner.runSeeded((module.runRepetition, job["seed"], job["run"]))
+    os.rename(path + "Claimed/" + name, path + "Done/" + name)
+    return generations, runTime
+
+
+def work(path=queuePath):
+    # claim and run jobs until none are pending
+    name = claimJob(path)
+    while name is not None:
+        generations, runTime = runJob(name, path)
+        print("Finished " + name + " after " + str(generations) + " generations in " + str(runTime) + " s")
+        name = claimJob(path)
+
+
+def requeueClaimed(path=queuePath):
+    # return the jobs of workers that died to Pending. Only use it while no worker is running, a live worker's job would
+    # be run twice. Interrupted runs resume from their checkpoint
+    names = os.listdir(path + "Claimed")
+    for name in names:
+        os.rename(path + "Claimed/" + name, path + "Pending/" + name)
+    return len(names)
+
+
+def report(path=queuePath):
+    return ", ".join(state + ": " + str(len(os.listdir(path + state))) for state in states)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Queue a parameter sweep on shared storage and work through it.")
+    parser.add_argument("command", choices=["queue", "work", "requeue", "status"],
+                        help="queue the sweep defined at the top of this file, run jobs from the queue, return the "
+                             "jobs of dead workers to the queue or count the jobs in every state")
+    parser.add_argument("--path", default=queuePath, help="directory of the queue")
+    parser.add_argument("--processes", type=int, default=1, help="number of local workers")
+    arguments = parser.parse_args()
+
+    if arguments.command == "queue":
+        print("Queued " + str(queueSweep(experiment, grid, repetitions, seed, arguments.path)) + " jobs")
+    elif arguments.command == "work":
+        workers = [multiprocessing.Process(target=work, args=(arguments.path,)) for i in range(arguments.processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    elif arguments.command == "requeue":
+        print("Requeued " + str(requeueClaimed(arguments.path)) + " jobs")
+    print(report(arguments.path))